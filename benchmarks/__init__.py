@@ -0,0 +1,4 @@
+"""Benchmarks for Django-Flags.
+
+Run with ``python -m benchmarks``; see ``python -m benchmarks --help``.
+"""
@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Run the Django-Flags benchmarks.",
+    )
+    parser.add_argument(
+        "names",
+        nargs="*",
+        help="only run benchmarks whose names contain one of these strings",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="write JSON results to this file instead of standard output",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=5,
+        help="number of timings for each benchmark (default: 5)",
+    )
+    parser.add_argument(
+        "-t",
+        "--min-time",
+        type=float,
+        default=0.2,
+        help="minimum seconds for each timing (default: 0.2)",
+    )
+    parser.add_argument(
+        "-l",
+        "--list",
+        action="store_true",
+        help="list the benchmarks instead of running them",
+    )
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+
+    from benchmarks import cases  # noqa F401
+    from benchmarks.runner import get_benchmarks, run_benchmarks
+
+    if args.list:
+        for name, kwargs, _fn in get_benchmarks(args.names):
+            print(name, json.dumps(kwargs))
+        return
+
+    results = run_benchmarks(
+        names=args.names,
+        repeat=args.repeat,
+        min_time=args.min_time,
+        stream=sys.stderr,
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
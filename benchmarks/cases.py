@@ -0,0 +1,167 @@
+import functools
+
+from django.contrib.auth import get_user_model
+from django.http import HttpRequest, HttpResponse, QueryDict
+from django.template import Context, Template
+from django.test import override_settings
+from django.urls import URLResolver, include, path
+from django.urls.resolvers import RegexPattern
+
+from benchmarks.runner import benchmark
+from flags.decorators import flag_check
+from flags.models import FlagState
+from flags.snapshot import invalidate_snapshot
+from flags.sources import Condition, Flag, get_flags
+from flags.state import flag_state
+from flags.urls import flagged_path
+
+
+@functools.cache
+def get_user():
+    return get_user_model()(username="benchmark-user")
+
+
+def make_request(path="/foo/bar", query_string="enable=True"):
+    request = HttpRequest()
+    request.method = "GET"
+    request.path = path
+    request.GET = QueryDict(query_string)
+    request.user = get_user()
+    return request
+
+
+def view(request):
+    return HttpResponse("view")
+
+
+ROWS = [{"rows": 10}, {"rows": 1000}, {"rows": 10000}]
+
+
+def create_flag_states(rows):
+    # Ten conditions per flag
+    FlagState.objects.bulk_create(
+        FlagState(
+            name=f"DB_FLAG_{i // 10}",
+            condition="parameter",
+            value=f"param{i}=True",
+        )
+        for i in range(rows)
+    )
+    invalidate_snapshot()
+
+
+def delete_flag_states():
+    FlagState.objects.all()._raw_delete(FlagState.objects.db)
+    invalidate_snapshot()
+
+
+@benchmark("get_flags", params=ROWS)
+def bench_get_flags(rows):
+    create_flag_states(rows)
+    yield get_flags
+    delete_flag_states()
+
+
+@benchmark("get_flags_snapshot", params=ROWS)
+def bench_get_flags_snapshot(rows):
+    create_flag_states(rows)
+    with override_settings(FLAGS_SNAPSHOT_CACHE=True):
+        yield get_flags
+    delete_flag_states()
+
+
+@benchmark("flag_state_database", params=ROWS)
+def bench_flag_state_database(rows):
+    create_flag_states(rows)
+    yield lambda: flag_state(
+        "DB_FLAG_0", request=make_request(query_string="param0=True")
+    )
+    delete_flag_states()
+
+
+CONDITION_MIXES = {
+    "boolean": [Condition("boolean", True)],
+    "required_mix": [
+        Condition("boolean", True, required=True),
+        Condition("path matches", r"^/foo", required=True),
+        Condition("parameter", "enable=True", required=True),
+        Condition("anonymous", False, required=True),
+    ],
+    "dates": [
+        Condition("after date", "2000-01-01T00:00:00Z", required=True),
+        Condition("before date", "3000-01-01T00:00:00Z", required=True),
+    ],
+    "paths_100": [
+        Condition("path matches", rf"^/path{i}/") for i in range(100)
+    ],
+    "users_100": [Condition("user", f"user-{i}") for i in range(100)],
+    "users_2000": [Condition("user", f"user-{i}") for i in range(2000)],
+    "parameters_100": [
+        Condition("parameter", f"param{i}=True") for i in range(100)
+    ],
+}
+
+
+@benchmark(
+    "check_state",
+    params=[{"conditions": name} for name in CONDITION_MIXES],
+)
+def bench_check_state(conditions):
+    flag = Flag("BENCHMARK_FLAG", list(CONDITION_MIXES[conditions]))
+    flag.compile()
+    request = make_request()
+    yield lambda: flag.check_state(request=request)
+
+
+LOOPS = [{"checks": 1}, {"checks": 100}]
+
+
+@benchmark("django_template_flag_enabled", params=LOOPS)
+def bench_django_template(checks):
+    template = Template(
+        "{% load feature_flags %}"
+        "{% for i in items %}"
+        "{% flag_enabled 'FLAG_ENABLED' as enabled %}{{ enabled }}"
+        "{% endfor %}"
+    )
+    items = range(checks)
+    yield lambda: template.render(
+        Context({"request": make_request(), "items": items})
+    )
+
+
+@benchmark("jinja2_flag_enabled", params=LOOPS)
+def bench_jinja2_template(checks):
+    from jinja2 import Environment
+
+    environment = Environment(extensions=["flags.jinja2tags.flags"])
+    template = environment.from_string(
+        "{% for i in items %}{{ flag_enabled('FLAG_ENABLED') }}{% endfor %}"
+    )
+    items = range(checks)
+    yield lambda: template.render(request=make_request(), items=items)
+
+
+@benchmark("flag_check_view", params=[{"snapshot": False}, {"snapshot": True}])
+def bench_flag_check_view(snapshot):
+    decorated = flag_check("FLAG_ENABLED", True)(view)
+    with override_settings(FLAGS_SNAPSHOT_CACHE=snapshot):
+        yield lambda: decorated(make_request())
+
+
+@benchmark(
+    "url_resolve",
+    params=[
+        {"routes": 300, "flagged": False},
+        {"routes": 300, "flagged": True},
+    ],
+)
+def bench_url_resolve(routes, flagged):
+    patterns = [path(f"route-{i}/", view) for i in range(routes)]
+    if flagged:
+        included = flagged_path("FLAG_ENABLED", "prefix/", include(patterns))
+    else:
+        included = path("prefix/", include(patterns))
+    resolver = URLResolver(RegexPattern(r"^/"), [included])
+    url = f"/prefix/route-{routes - 1}/"
+    yield lambda: resolver.resolve(url)
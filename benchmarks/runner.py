@@ -0,0 +1,107 @@
+import platform
+import statistics
+import sys
+import time
+import timeit
+from importlib import metadata
+
+
+# The registry of benchmarks, maintained by benchmark()
+_benchmarks = []
+
+
+def benchmark(name, params=None):
+    """Register a benchmark, once for each dict of keyword arguments in
+    `params`.
+
+    The benchmark is a generator function: code before its `yield` sets up
+    the benchmark, the yielded callable is timed, and code after the `yield`
+    cleans up."""
+
+    def decorator(fn):
+        for kwargs in params or [{}]:
+            _benchmarks.append((name, kwargs, fn))
+        return fn
+
+    return decorator
+
+
+def get_benchmarks(names=None):
+    """Return the registered benchmarks whose names contain any of the
+    given strings, or all benchmarks"""
+    return [
+        (name, kwargs, fn)
+        for name, kwargs, fn in _benchmarks
+        if not names or any(n in name for n in names)
+    ]
+
+
+def time_benchmark(fn, kwargs, repeat=5, min_time=0.2):
+    """Time one benchmark and return per-call timings in seconds"""
+    generator = fn(**kwargs)
+    func = next(generator)
+
+    try:
+        # Warm up any caches before calibrating
+        func()
+
+        timer = timeit.Timer(func)
+
+        # Find a number of calls that takes at least min_time
+        number = 1
+        while True:
+            elapsed = timer.timeit(number)
+            if elapsed >= min_time:
+                break
+            number *= 10 if elapsed < min_time / 10 else 2
+
+        timings = [t / number for t in timer.repeat(repeat, number)]
+    finally:
+        # Resume the benchmark so that it cleans up
+        next(generator, None)
+
+    return {
+        "number": number,
+        "repeat": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "stdev": statistics.stdev(timings) if repeat > 1 else 0.0,
+    }
+
+
+def get_metadata():
+    """Describe the environment the benchmarks ran in"""
+    try:
+        flags_version = metadata.version("django-flags")
+    except metadata.PackageNotFoundError:  # pragma: no cover
+        flags_version = None
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "django": metadata.version("django"),
+        "django-flags": flags_version,
+    }
+
+
+def run_benchmarks(names=None, repeat=5, min_time=0.2, stream=None):
+    """Run benchmarks and return their results"""
+    results = []
+    for name, kwargs, fn in get_benchmarks(names):
+        result = {"name": name, "params": kwargs}
+        result.update(
+            time_benchmark(fn, kwargs, repeat=repeat, min_time=min_time)
+        )
+        results.append(result)
+
+        if stream is not None:
+            params = ", ".join(f"{k}={v}" for k, v in kwargs.items())
+            stream.write(
+                f"{name}[{params}]: {result['median'] * 1e6:.2f} us "
+                f"(number={result['number']})\n"
+            )
+
+    return {"metadata": get_metadata(), "results": results}
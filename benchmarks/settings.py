@@ -0,0 +1,28 @@
+SECRET_KEY = "not needed"
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    },
+}
+
+INSTALLED_APPS = (
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "flags",
+)
+
+TEMPLATES = [
+    {
+        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "APP_DIRS": True,
+    }
+]
+
+USE_TZ = True
+
+FLAGS = {
+    "FLAG_ENABLED": [("boolean", True)],
+    "FLAG_DISABLED": [("boolean", False)],
+}
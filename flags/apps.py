@@ -7,3 +7,11 @@ class DjangoFlagsConfig(AppConfig):
     default_auto_field = "django.db.models.AutoField"
     name = "flags"
     verbose_name = "Django Flags"
+
+    def ready(self):
+        # Connect the signal receivers that invalidate the flags snapshot
+        from . import snapshot  # noqa F401
+        from .sources import get_sources
+
+        # Resolve FLAG_SOURCES once, before the first flag is checked
+        get_sources()
@@ -41,3 +41,19 @@ def flag_conditions_check(app_configs, **kwargs):
                     )
 
     return errors
+
+
+@register()
+def flag_dependencies_check(app_configs, **kwargs):
+    from flags.sources import find_flag_cycles, get_flags
+
+    return [
+        Warning(
+            f"Flags depend on each other: {' -> '.join(cycle)}.",
+            hint=(
+                "Remove a 'flag' condition so that no flag depends on itself."
+            ),
+            id="flags.E003",
+        )
+        for cycle in find_flag_cycles(get_flags(ignore_errors=True))
+    ]
@@ -6,6 +6,7 @@ from flags.conditions.conditions import (
     before_date_condition,
     boolean_condition,
     date_condition,
+    flag_condition,
     parameter_condition,
     path_condition,
     user_condition,
@@ -19,6 +20,7 @@ from flags.conditions.registry import (
 from flags.conditions.validators import (
     validate_boolean,
     validate_date,
+    validate_flag,
     validate_parameter,
     validate_path_re,
     validate_user,
@@ -1,4 +1,7 @@
+import datetime
+import functools
 import re
+from collections import Counter
 
 from django.contrib.auth import get_user_model
 from django.utils import dateparse, timezone
@@ -7,6 +10,7 @@ from flags.conditions.registry import register
 from flags.conditions.validators import (
     validate_boolean,
     validate_date,
+    validate_flag,
     validate_parameter,
     validate_path_re,
     validate_user,
@@ -18,16 +22,115 @@ class RequiredForCondition(AttributeError):
     """Raised when a kwarg that is required for a condition is not given"""
 
 
-@register("boolean", validator=validate_boolean)
+def prepare_boolean(value):
+    """Convert a boolean string to a bool"""
+    try:
+        return bool(strtobool(value.strip()))
+    except AttributeError:
+        return bool(value)
+
+
+def prepare_parameter(value):
+    """Split 'name=value' into a (name, value) tuple"""
+    try:
+        param_name, param_value = value.split("=")
+    except ValueError:
+        param_name, param_value = value, "True"
+    return (param_name, param_value)
+
+
+def prepare_date(value):
+    """Parse an ISO 8601 string into a datetime"""
+    if isinstance(value, str):
+        return dateparse.parse_datetime(value) or value
+    return value
+
+
+def date_boundary(value):
+    """Return the datetime at which a date condition's result changes"""
+    if isinstance(value, datetime.datetime) and timezone.is_aware(value):
+        return value
+    return None
+
+
+def index_boolean(values):
+    """Count the true values once, since they don't depend on any kwargs"""
+    count = sum(1 for value in values if boolean_condition(value))
+    return lambda **kwargs: count
+
+
+def index_user(usernames):
+    """Count the usernames that match request.user with a single lookup"""
+    counts = Counter(usernames)
+
+    def count(request=None, **kwargs):
+        if request is None:
+            raise RequiredForCondition(
+                "request is required for condition 'user'"
+            )
+
+        if request.user.is_anonymous:
+            return 0
+
+        return counts[getattr(request.user, get_user_model().USERNAME_FIELD)]
+
+    return count
+
+
+def index_parameter(param_names):
+    """Count the parameters that match request.GET with one lookup per
+    parameter name"""
+    counts = {}
+    for param_name in param_names:
+        if not isinstance(param_name, tuple):
+            param_name = prepare_parameter(param_name)
+        name, value = param_name
+        counts.setdefault(name, Counter())[value] += 1
+
+    def count(request=None, **kwargs):
+        if request is None:
+            raise RequiredForCondition(
+                "request is required for condition 'parameter'"
+            )
+
+        return sum(
+            value_counts[request.GET.get(name)]
+            for name, value_counts in counts.items()
+        )
+
+    return count
+
+
+@register(
+    "boolean",
+    validator=validate_boolean,
+    prepare=prepare_boolean,
+    requires=(),
+    index=index_boolean,
+    pure=True,
+    cache_scope="process",
+    cost=0,
+)
 def boolean_condition(condition, **kwargs):
     """Basic boolean check"""
+    if isinstance(condition, bool):
+        return condition
+
     try:
         return strtobool(condition.strip())
     except AttributeError:
         return bool(condition)
 
 
-@register("user", validator=validate_user)
+@register(
+    "user",
+    validator=validate_user,
+    requires=("request",),
+    index=index_user,
+    pure=True,
+    cache_scope="user",
+    cost=10,
+)
 def user_condition(username, request=None, **kwargs):
     """Does request.user match the expected username?"""
     if request is None:
@@ -39,7 +142,15 @@ def user_condition(username, request=None, **kwargs):
     return getattr(request.user, get_user_model().USERNAME_FIELD) == username
 
 
-@register("anonymous", validator=validate_boolean)
+@register(
+    "anonymous",
+    validator=validate_boolean,
+    prepare=prepare_boolean,
+    requires=("request",),
+    pure=True,
+    cache_scope="user",
+    cost=10,
+)
 def anonymous_condition(boolean_value, request=None, **kwargs):
     """request.user an anonymous user, true or false based on boolean_value"""
     if request is None:
@@ -49,44 +160,180 @@ def anonymous_condition(boolean_value, request=None, **kwargs):
 
     is_anonymous = bool(request.user.is_anonymous)
 
+    if isinstance(boolean_value, bool):
+        return boolean_value == is_anonymous
+
     try:
         return strtobool(boolean_value.strip().lower()) == is_anonymous
     except AttributeError:
         return bool(boolean_value) == is_anonymous
 
 
-@register("parameter", validator=validate_parameter)
+@register(
+    "parameter",
+    validator=validate_parameter,
+    prepare=prepare_parameter,
+    requires=("request",),
+    index=index_parameter,
+    pure=True,
+    cache_scope="request",
+    cost=1,
+)
 def parameter_condition(param_name, request=None, **kwargs):
     """Is the parameter name part of the GET parameters?"""
     if request is None:
         raise RequiredForCondition(
             "request is required for condition 'parameter'"
         )
-    try:
-        param_name, param_value = param_name.split("=")
-    except ValueError:
-        param_value = "True"
+
+    if isinstance(param_name, tuple):
+        param_name, param_value = param_name
+    else:
+        param_name, param_value = prepare_parameter(param_name)
 
     return request.GET.get(param_name) == param_value
 
 
-@register("path matches", validator=validate_path_re)
+@register(
+    "path matches",
+    validator=validate_path_re,
+    prepare=re.compile,
+    requires=("request",),
+    pure=True,
+    cache_scope="request",
+    cost=1,
+)
 def path_condition(pattern, request=None, **kwargs):
     """Does the request's path match the given regular expression?"""
     if request is None:
         raise RequiredForCondition("request is required for condition 'path'")
 
-    return bool(re.search(pattern, request.path))
+    if isinstance(pattern, str):
+        return bool(re.search(pattern, request.path))
 
+    return bool(pattern.search(request.path))
 
-@register("after date", validator=validate_date)
+
+class SharedPathPattern:
+    """A path pattern whose matches are found by a PathMatcher"""
+
+    def __init__(self, matcher, pattern):
+        self.matcher = matcher
+        self.pattern = pattern
+
+    def __eq__(self, other):
+        # Patterns match the same paths whichever matcher finds them
+        return (
+            isinstance(other, SharedPathPattern)
+            and other.pattern == self.pattern
+        )
+
+    def __hash__(self):
+        return hash(self.pattern)
+
+    def search(self, path):
+        return self.pattern in self.matcher.matches(path)
+
+
+class PathMatcher:
+    """Match a path against many regular expressions in a single scan.
+
+    Patterns are combined into one regular expression of optional
+    lookaheads, each with its own named group, so that one search finds
+    every pattern that matches anywhere in the path. Patterns that cannot
+    be combined, because they have their own named groups, backreferences,
+    or flags, are searched individually. The matched patterns are cached
+    per path."""
+
+    cache_size = 1024
+
+    def __init__(self, patterns):
+        self.group_patterns = {}
+        self.individual_patterns = []
+
+        combined = []
+        for pattern in dict.fromkeys(patterns):
+            compiled = re.compile(pattern)
+            group = f"p{len(self.group_patterns)}"
+            part = rf"(?=[\s\S]*?(?P<{group}>{compiled.pattern}))?"
+            if self._can_combine(compiled):
+                self.group_patterns[group] = pattern
+                combined.append(part)
+            else:
+                self.individual_patterns.append((pattern, compiled))
+
+        self.regex = re.compile("".join(combined)) if combined else None
+        self.matches = functools.lru_cache(maxsize=self.cache_size)(
+            self._matches
+        )
+
+    @staticmethod
+    def _can_combine(compiled):
+        # Group numbers shift in the combined regular expression, so
+        # patterns that refer to their groups are searched individually
+        return not (
+            compiled.groupindex
+            or compiled.flags != re.UNICODE
+            or re.search(r"\\[1-9]|\(\?P=|\(\?\(", compiled.pattern)
+        )
+
+    def _matches(self, path):
+        matches = set()
+
+        if self.regex is not None:
+            match = self.regex.match(path)
+            matches.update(
+                self.group_patterns[group]
+                for group, value in match.groupdict().items()
+                if value is not None
+            )
+
+        matches.update(
+            pattern
+            for pattern, compiled in self.individual_patterns
+            if compiled.search(path)
+        )
+
+        return frozenset(matches)
+
+
+def share_path_patterns(conditions):
+    """Give every "path matches" condition in conditions a pattern matched
+    by one shared PathMatcher, and return the matcher"""
+    path_conditions = []
+    for condition in conditions:
+        if condition.fn is not path_condition:
+            continue
+
+        pattern = condition.prepared_value
+        if isinstance(pattern, SharedPathPattern):
+            pattern = pattern.pattern
+
+        # Patterns that failed to compile are left to raise when checked
+        if isinstance(pattern, re.Pattern):
+            path_conditions.append((condition, pattern))
+
+    matcher = PathMatcher(pattern for _, pattern in path_conditions)
+    for condition, pattern in path_conditions:
+        condition.prepared_value = SharedPathPattern(matcher, pattern)
+
+    return matcher
+
+
+@register(
+    "after date",
+    validator=validate_date,
+    prepare=prepare_date,
+    requires=(),
+    boundary=date_boundary,
+    pure=False,
+    cache_scope="request",
+    cost=1,
+)
 def after_date_condition(date_or_str, **kwargs):
     """Is the the current date after the given date?
     date_or_str is either a date object or an ISO 8601 string"""
-    try:
-        date = dateparse.parse_datetime(date_or_str)
-    except TypeError:
-        date = date_or_str
+    date = prepare_date(date_or_str)
 
     now = timezone.now()
 
@@ -103,14 +350,20 @@ def after_date_condition(date_or_str, **kwargs):
 date_condition = after_date_condition
 
 
-@register("before date", validator=validate_date)
+@register(
+    "before date",
+    validator=validate_date,
+    prepare=prepare_date,
+    requires=(),
+    boundary=date_boundary,
+    pure=False,
+    cache_scope="request",
+    cost=1,
+)
 def before_date_condition(date_or_str, **kwargs):
     """Is the current date before the given date?
     date_or_str is either a date object or an ISO 8601 string"""
-    try:
-        date = dateparse.parse_datetime(date_or_str)
-    except TypeError:
-        date = date_or_str
+    date = prepare_date(date_or_str)
 
     now = timezone.now()
 
@@ -120,3 +373,13 @@ def before_date_condition(date_or_str, **kwargs):
         date_test = False
 
     return date_test
+
+
+@register("flag", validator=validate_flag, pure=True, cache_scope="request")
+def flag_condition(flag_name, **kwargs):
+    """Is the given flag enabled?
+    The flag is checked with the same kwargs, and its state is shared by
+    every flag that depends on it."""
+    from flags.state import _get_dependency_state
+
+    return bool(_get_dependency_state(flag_name, kwargs))
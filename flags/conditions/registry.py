@@ -2,12 +2,29 @@
 # condition_name: function
 _conditions = {}
 
+# How widely the result of a condition can be reused: within one request,
+# for the same user across requests, or by every check in the process
+CACHE_SCOPES = ("request", "user", "process")
+
 
 class DuplicateCondition(ValueError):
     """Raised when registering a condition that is already registered"""
 
 
-def register(condition_name, fn=None, validator=None):
+def register(
+    condition_name,
+    fn=None,
+    validator=None,
+    prepare=None,
+    requires=None,
+    boundary=None,
+    index=None,
+    batch=None,
+    pure=None,
+    cache_scope=None,
+    ttl=None,
+    cost=None,
+):
     """Register a condition to test for flag state.
 
     This function can be used as a decorator or the condition callable can be
@@ -18,15 +35,76 @@ def register(condition_name, fn=None, validator=None):
     explicitly given, it will override an existing `validate` attribute of the
     condition callable.
 
+    A callable to prepare condition values can be passed as `prepare` or can
+    be an attribute of the condition callable, fn.prepare, in the same way as
+    validators. It is called once with the value when a Condition is created,
+    and its result is passed to the condition instead of the value.
+
     Conditions can be any callable that takes a value and some number of
     required arguments (specified in 'requires') that were passed as kwargs
-    when checking the flag state."""
+    when checking the flag state. `requires` is a tuple of the names of those
+    arguments, and an empty tuple declares that the condition does not depend
+    on any of them. If it is not given, the condition may depend on any of
+    them.
+
+    Conditions whose result changes over time can be given a `boundary`
+    callable that takes the prepared value and returns the next datetime at
+    which the condition's result may change, or None.
+
+    Conditions that compare a value from the kwargs for equality can be given
+    an `index` callable that takes a list of prepared values and returns a
+    function. That function takes the same kwargs as the condition and
+    returns the number of the values for which the condition would pass, so
+    that many conditions of the same type can be checked with a single
+    lookup.
+
+    Conditions that are expensive to call once per value, such as those that
+    call another service, can be given a `batch` callable. It takes a list
+    of prepared values and the same kwargs as the condition and returns a
+    list of the condition's results for each value, so that all the values
+    of conditions of that type in a flag, or in all the flags checked by
+    flag_states(), are checked with one call. The condition callable itself
+    is still used to check single conditions where batching isn't possible.
+
+    Conditions are pure if their result depends only on their value and the
+    kwargs in `requires`, and checking them has no side effects. Conditions
+    that depend on anything else, like the current time or a random number,
+    should not be registered with pure=True. `cache_scope` declares how
+    widely a result of the condition can be reused, one of "request",
+    "user" or "process", and `ttl` the number of seconds a reused result
+    stays valid. Results of pure conditions with any `cache_scope` are
+    currently only reused within a single request, as if the scope were
+    "request", and `ttl` is not enforced; both are advisory for now.
+    Conditions without a `cache_scope` are checked every time.
+
+    `cost` is a number giving the relative cost of checking the condition.
+    Cheaper conditions are checked first, so that a flag can be decided
+    without checking expensive conditions. Conditions that only look at
+    their value cost 0, conditions that look at the request cost 1, and
+    conditions that load request.user or call other services cost 10 or
+    more. Conditions without a `cost` are assumed to cost 10.
+
+    `requires`, `boundary`, `index`, `batch`, `pure`, `cache_scope`, `ttl`
+    and `cost` can also be attributes of the condition callable."""
     global _conditions, _validators
 
     if fn is None:
         # Be a decorator
         def decorator(fn):
-            register(condition_name, fn=fn, validator=validator)
+            register(
+                condition_name,
+                fn=fn,
+                validator=validator,
+                prepare=prepare,
+                requires=requires,
+                boundary=boundary,
+                index=index,
+                batch=batch,
+                pure=pure,
+                cache_scope=cache_scope,
+                ttl=ttl,
+                cost=cost,
+            )
             return fn
 
         return decorator
@@ -37,11 +115,30 @@ def register(condition_name, fn=None, validator=None):
             f'Flag condition "{condition_name}" already registered.'
         )
 
+    if cache_scope is not None and cache_scope not in CACHE_SCOPES:
+        raise ValueError(
+            f'Invalid cache scope "{cache_scope}" for flag condition '
+            f'"{condition_name}", expected one of {", ".join(CACHE_SCOPES)}.'
+        )
+
     # We attach the validator to the callable to allow for both a single source
     # of truth for conditions (_conditions) and to allow for validators to be
-    # defined on a callable class along with their condition.
-    if validator is not None or not hasattr(fn, "validate"):
-        fn.validate = validator
+    # defined on a callable class along with their condition. The same goes
+    # for the other attributes of conditions.
+    for attribute, value in (
+        ("validate", validator),
+        ("prepare", prepare),
+        ("requires", requires),
+        ("boundary", boundary),
+        ("index", index),
+        ("batch", batch),
+        ("pure", pure),
+        ("cache_scope", cache_scope),
+        ("ttl", ttl),
+        ("cost", cost),
+    ):
+        if value is not None or not hasattr(fn, attribute):
+            setattr(fn, attribute, value)
 
     _conditions[condition_name] = fn
 
@@ -51,3 +51,10 @@ def validate_date(value):
     datetime = dateparse.parse_datetime(value)
     if datetime is None:
         raise ValidationError("Enter an ISO 8601 date representation.")
+
+
+def validate_flag(value):
+    from flags.sources import get_flags
+
+    if value not in get_flags(ignore_errors=True):
+        raise ValidationError("Enter the name of an existing flag.")
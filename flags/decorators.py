@@ -4,7 +4,9 @@ import warnings
 from django.http import Http404
 from django.utils.functional import wraps
 
-from flags.state import flag_state
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from flags.state import aflag_state, flag_state
 
 
 def flag_check(flag_name, state, fallback=None, **fc_kwargs):
@@ -27,6 +29,28 @@ def flag_check(flag_name, state, fallback=None, **fc_kwargs):
                     stacklevel=2,
                 )
 
+        # Coroutine views get a coroutine wrapper that checks the flag
+        # without blocking the event loop.
+        if iscoroutinefunction(func):
+
+            async def inner(request, *args, **kwargs):
+                enabled = await aflag_state(
+                    flag_name, request=request, **fc_kwargs
+                )
+
+                if (state and enabled) or (not state and not enabled):
+                    return await func(request, *args, **kwargs)
+                elif fallback is not None:
+                    if iscoroutinefunction(fallback):
+                        return await fallback(request, *args, **kwargs)
+                    return await sync_to_async(fallback)(
+                        request, *args, **kwargs
+                    )
+                else:
+                    raise Http404
+
+            return wraps(func)(inner)
+
         def inner(request, *args, **kwargs):
             enabled = flag_state(flag_name, request=request, **fc_kwargs)
 
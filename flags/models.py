@@ -6,6 +6,7 @@ class FlagState(models.Model):
     condition = models.CharField(max_length=64, default="boolean")
     value = models.CharField(max_length=127, default="True")
     required = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         app_label = "flags"
@@ -25,3 +26,17 @@ class FlagState(models.Model):
                 required=" (required)" if self.required else "",
             )
         )
+
+
+class FlagStateTombstone(models.Model):
+    """A record of a deleted FlagState, so that processes can remove it from
+    their flags without loading every flag again"""
+
+    flag_state_pk = models.IntegerField()
+    deleted_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        app_label = "flags"
+
+    def __str__(self):
+        return f"FlagState {self.flag_state_pk} deleted at {self.deleted_at}"
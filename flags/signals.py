@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+
+# Sent when a flag source raises an exception while getting flags. The
+# sender is the flag source class, and the receivers are given the source
+# instance, the exception, and the number of times in a row it has failed.
+source_failed = Signal()
@@ -0,0 +1,463 @@
+import datetime
+import logging
+import threading
+import time
+from types import MappingProxyType
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from asgiref.sync import sync_to_async
+
+from flags.conditions.conditions import share_path_patterns
+from flags.sources import (
+    SettingsFlagsSource,
+    _aload_source_flags,
+    _load_source_flags,
+    _merge_source_flags,
+    find_flag_cycles,
+    get_sources,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+# The current process-wide snapshot. Invalidation increments the generation
+# so that a snapshot built from data that changed mid-build is discarded
+# instead of being stored. When FlagState objects change, the discarded
+# snapshot is kept as _base, the snapshot that the changes are applied to.
+_snapshot = None
+_base = None
+_generation = 0
+_lock = threading.Lock()
+
+# Held while a background thread refreshes the snapshot, so that only one
+# refresh runs at a time in each process
+_refresh_lock = threading.Lock()
+
+# The snapshot that a request's flags are served from is cached on the
+# request as request.flag_snapshot
+REQUEST_CACHE_ATTRIBUTE = "flag_snapshot"
+
+# How a flag's state is determined: a constant state never changes, a
+# time-dependent state changes only at the dates in its conditions, and a
+# request-dependent state is checked every time.
+CONSTANT = "constant"
+TIME_DEPENDENT = "time-dependent"
+REQUEST_DEPENDENT = "request-dependent"
+
+# The key in the FLAGS_SNAPSHOT_CACHE_ALIAS cache that holds the flags
+# version shared by all processes.
+VERSION_CACHE_KEY = "flags.snapshot.version"
+
+# With FLAGS_SNAPSHOT_DELTA_SYNC, each sync fetches the FlagState objects
+# saved since this long before the previous sync started, so that changes
+# committed late or saved by a process with a slower clock are not missed.
+# Tombstones of deleted FlagState objects are kept for TOMBSTONE_RETENTION;
+# a snapshot synced longer ago than that is loaded again in full.
+DELTA_SYNC_OVERLAP = datetime.timedelta(seconds=60)
+TOMBSTONE_RETENTION = datetime.timedelta(days=1)
+
+
+class FlagsSnapshot:
+    """An immutable view of all flags from all sources in FLAG_SOURCES"""
+
+    def __init__(self, flags, version=None, source_flags=None, synced_at=None):
+        # The states of flags that do not depend on the request are checked
+        # once, and stay valid until the earliest date at which any of them
+        # may change.
+        now = timezone.now()
+        boundaries = []
+        kinds = {}
+        states = {}
+        for name, flag in flags.items():
+            # A flag that can't be compiled or checked now is checked, and
+            # raises, only when it is used, as it would be without a snapshot
+            try:
+                flag.compile()
+                if not flag.is_request_independent():
+                    kinds[name] = REQUEST_DEPENDENT
+                    continue
+
+                states[name], flag_boundaries = flag.precompute()
+            except Exception:
+                kinds[name] = REQUEST_DEPENDENT
+                continue
+
+            flag_boundaries = [b for b in flag_boundaries if b >= now]
+            kinds[name] = TIME_DEPENDENT if flag_boundaries else CONSTANT
+            boundaries.extend(flag_boundaries)
+
+        self.kinds = MappingProxyType(kinds)
+        self.states = MappingProxyType(states)
+        self.expires_at = min(boundaries).timestamp() if boundaries else None
+
+        # Flag conditions in a cycle are checked as False. The cycles are
+        # reported by the flags.E003 check.
+        self.cycles = find_flag_cycles(flags)
+        for cycle in self.cycles:
+            logger.warning(
+                "Flags depend on each other: %s.", " -> ".join(cycle)
+            )
+
+        # Each request path is matched once against the path patterns of
+        # all flags, and the result shared by every flag that checks it.
+        self.path_matcher = share_path_patterns(
+            c for flag in flags.values() for c in flag.conditions
+        )
+
+        self.flags = MappingProxyType(flags)
+        self.version = version
+        self.checked_at = time.monotonic()
+
+        # The flags from each source, and the time from which FlagState
+        # changes have to be applied to them to bring them up to date
+        self.source_flags = source_flags
+        self.synced_at = synced_at
+
+        # When the snapshot was first found to be out of date, if it is
+        # served while it is refreshed in the background
+        self.stale_since = None
+
+
+def _delta_sync_enabled():
+    return getattr(settings, "FLAGS_SNAPSHOT_DELTA_SYNC", False)
+
+
+def _can_sync(snapshot):
+    """Can the FlagState changes since the snapshot was loaded be applied to
+    it, instead of loading every flag again?"""
+    if (
+        snapshot is None
+        or snapshot.synced_at is None
+        or not _delta_sync_enabled()
+        or timezone.now() - snapshot.synced_at >= TOMBSTONE_RETENTION
+    ):
+        return False
+
+    # Settings changes discard the snapshot, so only sources that can apply
+    # FlagState changes may have changed since
+    sources = [source for source, _ in snapshot.source_flags]
+    return sources == list(get_sources()) and all(
+        isinstance(source, SettingsFlagsSource)
+        or hasattr(source, "get_changed_flags")
+        for source in sources
+    )
+
+
+def _sync_source_flags(snapshot):
+    """Return the flags from each source in the snapshot with the FlagState
+    changes since it was loaded applied to them"""
+    return [
+        (
+            source,
+            source.get_changed_flags(flags, snapshot.synced_at)
+            if hasattr(source, "get_changed_flags")
+            else flags,
+        )
+        for source, flags in snapshot.source_flags
+    ]
+
+
+def _get_synced_at():
+    if _delta_sync_enabled():
+        return timezone.now() - DELTA_SYNC_OVERLAP
+
+
+def _build_snapshot(source_flags, version, synced_at):
+    return FlagsSnapshot(
+        _merge_source_flags(source_flags),
+        version=version,
+        # The flags from each source are only kept to apply changes to
+        source_flags=source_flags if synced_at is not None else None,
+        synced_at=synced_at,
+    )
+
+
+def _load_snapshot(version, base=None):
+    """Build a snapshot from base with the FlagState changes since it was
+    loaded, if possible, or from every flag in FLAG_SOURCES"""
+    synced_at = _get_synced_at()
+    if _can_sync(base):
+        source_flags = _sync_source_flags(base)
+    else:
+        source_flags = _load_source_flags()
+    return _build_snapshot(source_flags, version, synced_at)
+
+
+async def _aload_snapshot(version, base=None):
+    """Asynchronous version of _load_snapshot()"""
+    if _can_sync(base):
+        return await sync_to_async(_load_snapshot)(version, base)
+
+    synced_at = _get_synced_at()
+    source_flags = await _aload_source_flags()
+    return _build_snapshot(source_flags, version, synced_at)
+
+
+def _get_version_cache():
+    alias = getattr(settings, "FLAGS_SNAPSHOT_CACHE_ALIAS", None)
+    if alias is not None:
+        return caches[alias]
+
+
+def _initial_version():
+    # A version key that was evicted must not come back with a value that
+    # a process may still hold, so new keys start from the current time.
+    return time.time_ns()
+
+
+def get_version():
+    """Return the shared flags version, or None if it is not configured"""
+    cache = _get_version_cache()
+    if cache is None:
+        return None
+
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(VERSION_CACHE_KEY, _initial_version(), timeout=None)
+        version = cache.get(VERSION_CACHE_KEY)
+
+    return version
+
+
+async def aget_version():
+    """Return the shared flags version without blocking the event loop"""
+    cache = _get_version_cache()
+    if cache is None:
+        return None
+
+    version = await cache.aget(VERSION_CACHE_KEY)
+    if version is None:
+        await cache.aadd(VERSION_CACHE_KEY, _initial_version(), timeout=None)
+        version = await cache.aget(VERSION_CACHE_KEY)
+
+    return version
+
+
+def bump_version():
+    """Move the shared flags version so that all processes rebuild their
+    snapshots, and discard this process's snapshot"""
+    cache = _get_version_cache()
+    if cache is not None:
+        try:
+            cache.incr(VERSION_CACHE_KEY)
+        except ValueError:
+            cache.set(VERSION_CACHE_KEY, _initial_version(), timeout=None)
+
+    _discard_snapshot(keep_base=True)
+
+
+def _should_check_version(snapshot):
+    if _get_version_cache() is None:
+        return False
+
+    interval = getattr(settings, "FLAGS_SNAPSHOT_VERSION_CHECK_INTERVAL", 0)
+    now = time.monotonic()
+    if now - snapshot.checked_at < interval:
+        return False
+
+    snapshot.checked_at = now
+    return True
+
+
+def _is_expired(snapshot):
+    return (
+        snapshot.expires_at is not None and time.time() >= snapshot.expires_at
+    )
+
+
+def _refresh_expired(snapshot):
+    """Return a snapshot of the same flags with their precomputed states
+    checked again, if the snapshot has passed the date at which they may
+    change"""
+    if snapshot is None or not _is_expired(snapshot):
+        return snapshot
+
+    generation = _generation
+    snapshot = FlagsSnapshot(
+        dict(snapshot.flags),
+        version=snapshot.version,
+        source_flags=snapshot.source_flags,
+        synced_at=snapshot.synced_at,
+    )
+    _store_snapshot(snapshot, generation)
+    return snapshot
+
+
+def _store_snapshot(snapshot, generation):
+    global _snapshot, _base
+
+    with _lock:
+        if generation == _generation:
+            _snapshot = snapshot
+            _base = None
+
+
+def _serve_stale(snapshot):
+    """Start refreshing an out-of-date snapshot in the background, and return
+    whether it may be served until the refresh is done"""
+    if not getattr(settings, "FLAGS_SNAPSHOT_BACKGROUND_REFRESH", False):
+        return False
+
+    now = time.monotonic()
+    if snapshot.stale_since is None:
+        snapshot.stale_since = now
+
+    max_staleness = getattr(settings, "FLAGS_SNAPSHOT_MAX_STALENESS", 30)
+    if now - snapshot.stale_since > max_staleness:
+        return False
+
+    # Requests that find a refresh already running don't start another
+    if _refresh_lock.acquire(blocking=False):
+        try:
+            _start_refresh_thread(snapshot)
+        except Exception:
+            _refresh_lock.release()
+            raise
+
+    return True
+
+
+def _start_refresh_thread(snapshot):
+    threading.Thread(
+        target=_refresh_in_background,
+        args=(snapshot,),
+        name="flags-snapshot-refresh",
+        daemon=True,
+    ).start()
+
+
+def _refresh_in_background(snapshot):
+    try:
+        _rebuild_snapshot(snapshot)
+    except Exception:
+        logger.exception("Could not refresh the flags snapshot.")
+    finally:
+        # This thread's database connections are not used again
+        connections.close_all()
+        _refresh_lock.release()
+
+
+def _rebuild_snapshot(snapshot):
+    generation = _generation
+
+    # Read the version before loading so that a change made while loading
+    # moves the version past the one recorded in the snapshot.
+    version = get_version()
+    snapshot = _load_snapshot(version, base=snapshot or _base)
+    _store_snapshot(snapshot, generation)
+
+    return snapshot
+
+
+def get_snapshot():
+    """Return the current flags snapshot, building it if necessary"""
+    snapshot = _refresh_expired(_snapshot)
+    if snapshot is not None and (
+        not _should_check_version(snapshot)
+        or get_version() == snapshot.version
+        or _serve_stale(snapshot)
+    ):
+        return snapshot
+
+    return _rebuild_snapshot(snapshot)
+
+
+async def aget_snapshot():
+    """Return the current flags snapshot, building it if necessary, without
+    blocking the event loop"""
+    snapshot = _refresh_expired(_snapshot)
+    if snapshot is not None and (
+        not _should_check_version(snapshot)
+        or await aget_version() == snapshot.version
+        or _serve_stale(snapshot)
+    ):
+        return snapshot
+
+    generation = _generation
+    version = await aget_version()
+    snapshot = await _aload_snapshot(version, base=snapshot or _base)
+    _store_snapshot(snapshot, generation)
+
+    return snapshot
+
+
+def get_request_snapshot(request=None):
+    """Return the current flags snapshot, or the snapshot the given request's
+    flags are already served from"""
+    if request is None:
+        return get_snapshot()
+
+    snapshot = getattr(request, REQUEST_CACHE_ATTRIBUTE, None)
+    if snapshot is None:
+        snapshot = get_snapshot()
+        setattr(request, REQUEST_CACHE_ATTRIBUTE, snapshot)
+
+    return snapshot
+
+
+async def aget_request_snapshot(request=None):
+    """Asynchronous version of get_request_snapshot()"""
+    if request is None:
+        return await aget_snapshot()
+
+    snapshot = getattr(request, REQUEST_CACHE_ATTRIBUTE, None)
+    if snapshot is None:
+        snapshot = await aget_snapshot()
+        setattr(request, REQUEST_CACHE_ATTRIBUTE, snapshot)
+
+    return snapshot
+
+
+def _discard_snapshot(keep_base=False):
+    global _snapshot, _base, _generation
+
+    with _lock:
+        _generation += 1
+        _base = (_snapshot or _base) if keep_base else None
+        _snapshot = None
+
+
+def invalidate_snapshot():
+    """Discard the current flags snapshot so it is rebuilt on next use"""
+    _discard_snapshot()
+
+
+@receiver(post_save, sender="flags.FlagState")
+@receiver(post_delete, sender="flags.FlagState")
+def flag_state_changed(using=None, **kwargs):
+    # Other processes must not rebuild their snapshots until the change is
+    # visible to them, so the shared version only moves on commit.
+    _discard_snapshot(keep_base=True)
+    transaction.on_commit(bump_version, using=using)
+
+
+@receiver(post_delete, sender="flags.FlagState")
+def flag_state_deleted(instance, using=None, **kwargs):
+    # Deleted rows can't be fetched by a delta sync, so they leave a
+    # tombstone in the same transaction
+    if not _delta_sync_enabled():
+        return
+
+    FlagStateTombstone = apps.get_model("flags", "FlagStateTombstone")
+    now = timezone.now()
+    FlagStateTombstone.objects.using(using).create(
+        flag_state_pk=instance.pk, deleted_at=now
+    )
+    FlagStateTombstone.objects.using(using).filter(
+        deleted_at__lt=now - TOMBSTONE_RETENTION
+    ).delete()
+
+
+@receiver(setting_changed)
+def flag_setting_changed(setting, **kwargs):
+    if setting.startswith("FLAG"):
+        invalidate_snapshot()
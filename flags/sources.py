@@ -1,14 +1,40 @@
+import contextlib
 import logging
+import operator
+import time
 
 from django.apps import apps
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.utils.module_loading import import_string
 
+from asgiref.sync import sync_to_async
+
 from flags.conditions import get_condition
+from flags.signals import source_failed
 
 
 logger = logging.getLogger(__name__)
 
+# Flags are cached on the request as request.flag_conditions
+REQUEST_CACHE_ATTRIBUTE = "flag_conditions"
+
+# The state of a flag that has not been precomputed, and the result of a
+# check that has not been made
+_NOT_PRECOMPUTED = _NOT_CHECKED = object()
+
+
+# The cost of checking a condition that doesn't declare one
+DEFAULT_COST = 10
+
+
+def _get_cost(check):
+    cost = getattr(check.fn, "cost", None)
+    if cost is None:
+        return DEFAULT_COST
+    return cost
+
 
 class Condition:
     """A simple wrapper around conditions"""
@@ -16,15 +42,122 @@ class Condition:
     def __init__(self, condition, value, required=False):
         self.condition = condition
         self.value = value
-        self.fn = get_condition(self.condition)
         self.required = required
+        self._set_fn(get_condition(self.condition))
 
     def __eq__(self, other):
         return other.condition == self.condition and other.value == self.value
 
+    @property
+    def prepared_value(self):
+        """The value passed to the condition callable"""
+        return self._prepared_value
+
+    @prepared_value.setter
+    def prepared_value(self, value):
+        self._prepared_value = value
+
+        # Results of pure conditions that can be reused are shared by all
+        # conditions with the same name and prepared value.
+        self.memo_key = None
+        if self.pure and self.cache_scope is not None:
+            memo_key = (self.condition, value)
+            with contextlib.suppress(TypeError):
+                hash(memo_key)
+                self.memo_key = memo_key
+
+    def _set_fn(self, fn):
+        """Set the condition callable and prepare the value for it"""
+        self.fn = fn
+        self.prepared_value = self.value
+
+        prepare = getattr(fn, "prepare", None)
+        if prepare is not None:
+            # Values that can't be prepared are passed to the condition
+            # as-is, so that any error is raised when the condition is
+            # checked and reported by the system checks.
+            with contextlib.suppress(Exception):
+                self.prepared_value = prepare(self.value)
+
     def check(self, **kwargs):
+        # The condition may have been registered after this object was
+        # created, for example for flags parsed from settings.
+        if self.fn is None:
+            self._set_fn(get_condition(self.condition))
+
         if self.fn is not None:
-            return self.fn(self.value, **kwargs)
+            return self.fn(self.prepared_value, **kwargs)
+
+    @property
+    def requires(self):
+        """The names of the kwargs this condition depends on, or None if it
+        may depend on any of them"""
+        return getattr(self.fn, "requires", None)
+
+    @property
+    def pure(self):
+        """Whether this condition's result depends only on its value and the
+        kwargs it requires"""
+        return bool(getattr(self.fn, "pure", False))
+
+    @property
+    def cache_scope(self):
+        """How widely a result of this condition can be reused, if at all"""
+        return getattr(self.fn, "cache_scope", None)
+
+    @property
+    def ttl(self):
+        """The number of seconds a reused result of this condition is valid.
+        This is advisory and not yet enforced."""
+        return getattr(self.fn, "ttl", None)
+
+    def get_boundary(self):
+        """Return the next datetime at which this condition's result may
+        change without any change to the kwargs it is checked with"""
+        boundary = getattr(self.fn, "boundary", None)
+        if boundary is not None:
+            return boundary(self.prepared_value)
+
+
+class IndexedConditions:
+    """Conditions of the same type that are checked together with the
+    index of their condition callable"""
+
+    memo_key = None
+
+    def __init__(self, conditions, required=False):
+        self.conditions = conditions
+        self.required = required
+        self.fn = conditions[0].fn
+        self.count = self.fn.index([c.prepared_value for c in conditions])
+
+    def check(self, **kwargs):
+        count = self.count(**kwargs)
+        if self.required:
+            return count == len(self.conditions)
+        return count > 0
+
+
+class BatchedConditions:
+    """Conditions of the same type that are checked together with one call
+    to the batch function of their condition callable"""
+
+    memo_key = None
+
+    def __init__(self, conditions, required=False):
+        self.conditions = conditions
+        self.required = required
+        self.fn = conditions[0].fn
+        self.values = [c.prepared_value for c in conditions]
+
+    def combine(self, results):
+        """Return the result of this check from the result for each value"""
+        if self.required:
+            return all(results)
+        return any(results)
+
+    def check(self, **kwargs):
+        return self.combine(self.fn.batch(self.values, **kwargs))
 
 
 class Flag:
@@ -40,108 +173,704 @@ class Flag:
         """There can be only one feature flag of a given name"""
         return other.name == self.name
 
+    @property
+    def conditions(self):
+        return self._conditions
+
+    @conditions.setter
+    def conditions(self, conditions):
+        # Assigning conditions (including with +=) discards the compiled
+        # evaluation plan and any precomputed state.
+        self._conditions = conditions
+        self._plan = None
+        self._state = _NOT_PRECOMPUTED
+
+    def compile(self):
+        """Build this flag's evaluation plan, reused by every check_state():
+        its conditions, with those of the same type grouped, in the order
+        they are checked. Cheaper conditions are checked first, and required
+        conditions before non-required conditions of the same cost."""
+        checks = self._compile_checks(
+            [c for c in self.conditions if c.required], required=True
+        ) + self._compile_checks(
+            [c for c in self.conditions if not c.required], required=False
+        )
+        self._plan = tuple(
+            sorted(checks, key=lambda c: (_get_cost(c), not c.required))
+        )
+        self._required_count = sum(1 for c in checks if c.required)
+        return self._plan
+
+    @staticmethod
+    def _compile_checks(conditions, required):
+        """Replace conditions of the same type that can be indexed or batched
+        with a single check in place of the first of them"""
+        grouped = {}
+        for c in conditions:
+            if (
+                getattr(c.fn, "index", None) is not None
+                or getattr(c.fn, "batch", None) is not None
+            ):
+                grouped.setdefault(c.fn, []).append(c)
+
+        for fn, group in list(grouped.items()):
+            # Indexes are only worth building for more than one value, but
+            # single batched conditions can be batched with other flags'.
+            if getattr(fn, "index", None) is not None and len(group) > 1:
+                try:
+                    grouped[fn] = IndexedConditions(group, required=required)
+                    continue
+                except Exception:
+                    # Values that can't be indexed, such as unhashable or
+                    # invalid values, are batched or checked one by one, so
+                    # that they only raise when they are checked.
+                    pass
+
+            if getattr(fn, "batch", None) is not None:
+                grouped[fn] = BatchedConditions(group, required=required)
+            else:
+                del grouped[fn]
+
+        checks = []
+        for c in conditions:
+            group = grouped.get(c.fn)
+            if group is None:
+                checks.append(c)
+            elif group.conditions[0] is c:
+                checks.append(group)
+
+        return tuple(checks)
+
+    def is_request_independent(self):
+        """Return True if none of this flag's conditions depend on the kwargs
+        given to check_state(), and their results can only change at their
+        boundaries"""
+        return all(
+            c.requires == ()
+            and (c.pure or getattr(c.fn, "boundary", None) is not None)
+            for c in self.conditions
+        )
+
+    def precompute(self):
+        """Check the state of a request-independent flag now and return it
+        from every check_state() until the conditions change or precompute()
+        is called again. Return the state and the datetimes at which it may
+        change."""
+        self._state = _NOT_PRECOMPUTED
+        self._state = self.check_state()
+        boundaries = [
+            boundary
+            for boundary in (c.get_boundary() for c in self.conditions)
+            if boundary is not None
+        ]
+        return self._state, boundaries
+
     def check_state(self, **kwargs):
         """Determine this flag's state based on any of its conditions"""
-        non_required_conditions = [
-            c for c in self.conditions if not c.required
-        ]
-        required_conditions = [c for c in self.conditions if c.required]
+        return self._check_state(kwargs)
 
-        if len(non_required_conditions) == 0 and len(required_conditions) == 0:
+    def _check_state(self, kwargs, results=None, memo=None):
+        """Determine this flag's state, taking the results of checks in the
+        evaluation plan that were already made from results, a dict keyed by
+        the id() of each check, and sharing the results of pure conditions
+        through memo, a dict keyed by their memo_key"""
+        if getattr(settings, "FLAGS_STATE_LOGGING", False):
+            return self._check_state_logged(**kwargs)
+
+        if self._state is not _NOT_PRECOMPUTED:
+            return self._state
+
+        plan = self._plan or self.compile()
+        if not plan:
+            return False
+
+        if results or memo is not None:
+
+            def check(c):
+                result = _NOT_CHECKED
+                if results:
+                    result = results.get(id(c), _NOT_CHECKED)
+
+                if (
+                    result is _NOT_CHECKED
+                    and memo is not None
+                    and c.memo_key is not None
+                ):
+                    result = memo.get(c.memo_key, _NOT_CHECKED)
+                    if result is _NOT_CHECKED:
+                        result = memo[c.memo_key] = c.check(**kwargs)
+
+                if result is _NOT_CHECKED:
+                    result = c.check(**kwargs)
+
+                return result
+
+        else:
+            check = operator.methodcaller("check", **kwargs)
+
+        # Checking stops at the first required condition that fails, when
+        # every non-required condition has failed, and when every required
+        # condition and any non-required condition have passed.
+        required_left = self._required_count
+        non_required_left = len(plan) - required_left
+        passed = non_required_left == 0
+        for c in plan:
+            if c.required:
+                if not check(c):
+                    return False
+                required_left -= 1
+            elif passed:
+                continue
+            elif check(c):
+                passed = True
+            else:
+                non_required_left -= 1
+                if non_required_left == 0:
+                    return False
+
+            if passed and required_left == 0:
+                break
+
+        return passed
+
+    def _check_state_logged(self, **kwargs):
+        """Check every condition so that all of them can be logged"""
+        if len(self.conditions) == 0:
             return False
 
         checked_conditions = [(c, c.check(**kwargs)) for c in self.conditions]
 
+        non_required_states = [
+            s for c, s in checked_conditions if not c.required
+        ]
         state = (
-            any(
-                state
-                for c, state in checked_conditions
-                if c in non_required_conditions
-            )
-            if len(non_required_conditions) > 0
-            else True
-        ) and (
-            all(
-                state
-                for c, state in checked_conditions
-                if c in required_conditions
+            any(non_required_states) if non_required_states else True
+        ) and all(s for c, s in checked_conditions if c.required)
+
+        logger.info(
+            "Flag {name} evaluated {state} with "
+            "condition{conditions_plural}: {conditions}.".format(
+                name=self.name,
+                state=state,
+                conditions=", ".join(
+                    f"{c.condition} ({v})" for c, v in checked_conditions
+                ),
+                conditions_plural="s" if len(self.conditions) > 1 else "",
             )
         )
 
-        if getattr(settings, "FLAGS_STATE_LOGGING", False):
-            logger.info(
-                "Flag {name} evaluated {state} with "
-                "condition{conditions_plural}: {conditions}.".format(
-                    name=self.name,
-                    state=state,
-                    conditions=", ".join(
-                        f"{c.condition} ({v})" for c, v in checked_conditions
-                    ),
-                    conditions_plural="s" if len(self.conditions) > 1 else "",
-                )
+        return state
+
+
+def _check_batches(flags, kwargs):
+    """Check the batched conditions of all the given flags with one call to
+    the batch function of each condition type, and return the results keyed
+    by the id() of each BatchedConditions check.
+
+    Batches are checked before any flag, so they include the conditions of
+    flags that a cheaper condition would decide without them. One call for
+    all flags is expected to cost less than the calls it replaces."""
+    batches = {}
+    for flag in flags:
+        if flag._state is not _NOT_PRECOMPUTED:
+            continue
+
+        for check in flag._plan or flag.compile():
+            if isinstance(check, BatchedConditions):
+                batches.setdefault(check.fn, []).append(check)
+
+    results = {}
+    for fn, checks in batches.items():
+        # A single batch is checked with its flag, which may not need it
+        if len(checks) < 2:
+            continue
+
+        values = [value for check in checks for value in check.values]
+        value_results = iter(fn.batch(values, **kwargs))
+        for check in checks:
+            results[id(check)] = check.combine(
+                [next(value_results) for _ in check.values]
             )
 
-        return state
+    return results
+
+
+def check_flags(flags, **kwargs):
+    """Return a dict of the names and states of the given Flag objects,
+    checking the conditions of all of them that can be batched together and
+    checking identical pure conditions once"""
+    return _check_flags(flags, kwargs, {})
+
+
+def _check_flags(flags, kwargs, memo):
+    results = None
+    if len(flags) > 1 and not getattr(settings, "FLAGS_STATE_LOGGING", False):
+        results = _check_batches(flags, kwargs)
+
+    states = {}
+    for flag in flags:
+        # Flags are shared with the flag conditions that depend on them
+        memo_key = ("flag", flag.name)
+        state = memo.get(memo_key, _NOT_CHECKED)
+        if state is _NOT_CHECKED:
+            state = memo[memo_key] = flag._check_state(kwargs, results, memo)
+        states[flag.name] = state
+
+    return states
+
+
+def find_flag_cycles(flags):
+    """Return the cycles of flags whose flag conditions depend on each
+    other, each as a tuple of flag names that starts and ends with the same
+    flag"""
+    dependencies = {
+        name: [
+            c.value
+            for c in flag.conditions
+            if c.condition == "flag"
+            and isinstance(c.value, str)
+            and c.value in flags
+        ]
+        for name, flag in flags.items()
+    }
+
+    cycles = []
+    seen_cycles = set()
+    finished = set()
+
+    for start in dependencies:
+        if start in finished:
+            continue
+
+        # Depth-first search that keeps the path to the current flag, so
+        # that a dependency already on the path closes a cycle.
+        path = [start]
+        stack = [iter(dependencies[start])]
+        while stack:
+            dependency = next(stack[-1], None)
+            if dependency is None:
+                finished.add(path.pop())
+                stack.pop()
+            elif dependency in path:
+                cycle = path[path.index(dependency) :]
+                if frozenset(cycle) not in seen_cycles:
+                    seen_cycles.add(frozenset(cycle))
+                    cycles.append((*cycle, dependency))
+            elif dependency not in finished:
+                path.append(dependency)
+                stack.append(iter(dependencies[dependency]))
+
+    return cycles
+
+
+# The conditions parsed from settings.FLAGS, shared by all instances of
+# SettingsFlagsSource until the setting changes.
+_settings_flags = None
+
+
+def _parse_settings_flags():
+    settings_flags = getattr(settings, "FLAGS", {}).items()
+    flags = {}
+    for flag, conditions in settings_flags:
+        # Flag conditions should be a list of either 3-tuples of
+        # dictionaries in the form (condition, value, required) or
+        # {'name': 'condition', 'value': value, 'required': True}
+        # but contiune to support 2-tuples for unrequired conditions.
+        flags[flag] = []
+        for c in conditions:
+            # {'name': 'condition', 'value': value, 'required': True}
+            if isinstance(c, dict):
+                condition = Condition(
+                    c["condition"],
+                    c["value"],
+                    required=c.get("required", False),
+                )
+
+            # (condition, value, required)
+            elif len(c) == 3:
+                condition = Condition(c[0], c[1], required=c[2])
+
+            # (condition, value)
+            else:
+                condition = Condition(c[0], c[1], required=False)
+
+            flags[flag].append(condition)
+
+        flags[flag] = tuple(flags[flag])
+
+    return flags
+
+
+@receiver(setting_changed)
+def _flag_settings_changed(setting, **kwargs):
+    global _settings_flags, _flag_sources
+
+    if setting == "FLAGS":
+        _settings_flags = None
+
+    if setting == "FLAG_SOURCES":
+        _flag_sources = None
+        _source_instances.clear()
+        _source_health.clear()
 
 
 class SettingsFlagsSource:
     def get_flags(self):
-        settings_flags = getattr(settings, "FLAGS", {}).items()
-        flags = {}
-        for flag, conditions in settings_flags:
-            # Flag conditions should be a list of either 3-tuples of
-            # dictionaries in the form (condition, value, required) or
-            # {'name': 'condition', 'value': value, 'required': True}
-            # but contiune to support 2-tuples for unrequired conditions.
-            flags[flag] = []
-            for c in conditions:
-                # {'name': 'condition', 'value': value, 'required': True}
-                if isinstance(c, dict):
-                    condition = Condition(
-                        c["condition"],
-                        c["value"],
-                        required=c.get("required", False),
-                    )
-
-                # (condition, value, required)
-                elif len(c) == 3:
-                    condition = Condition(c[0], c[1], required=c[2])
-
-                # (condition, value)
-                else:
-                    condition = Condition(c[0], c[1], required=False)
+        global _settings_flags
 
-                flags[flag].append(condition)
+        if _settings_flags is None:
+            _settings_flags = _parse_settings_flags()
 
-        return flags
+        # The Condition objects are shared, but each caller gets its own
+        # lists to add to.
+        return {
+            flag: list(conditions)
+            for flag, conditions in _settings_flags.items()
+        }
+
+    def get_flag(self, flag_name):
+        global _settings_flags
+
+        if _settings_flags is None:
+            _settings_flags = _parse_settings_flags()
+
+        conditions = _settings_flags.get(flag_name)
+        return None if conditions is None else list(conditions)
+
+    async def aget_flags(self):
+        # Parsing settings does no I/O, so there is no need to leave the
+        # event loop.
+        return self.get_flags()
 
 
 class DatabaseCondition(Condition):
-    """Condition that includes the FlagState database object"""
+    """Condition that includes the FlagState database object.
+
+    Sources that only load the FlagState's fields give its primary key
+    instead, and the object is fetched the first time it is needed."""
 
-    def __init__(self, condition, value, required=False, obj=None):
+    def __init__(self, condition, value, required=False, obj=None, pk=None):
         super().__init__(condition, value, required=required)
-        self.obj = obj
+        self._obj = obj
+        self.pk = obj.pk if obj is not None else pk
+
+    @property
+    def obj(self):
+        if self._obj is None and self.pk is not None:
+            FlagState = apps.get_model("flags", "FlagState")
+            self._obj = FlagState.objects.filter(pk=self.pk).first()
+        return self._obj
 
 
 class DatabaseFlagsSource:
+    # The number of rows fetched from the database at a time
+    chunk_size = 2000
+
+    fields = ("pk", "name", "condition", "value", "required")
+
     def get_queryset(self):
         FlagState = apps.get_model("flags", "FlagState")
         return FlagState.objects.all()
 
+    def _get_rows(self):
+        # Named rows are iterated lazily, so that aiterator() fetches them
+        # outside of the event loop
+        return self.get_queryset().values_list(*self.fields, named=True)
+
+    def _add_flag_state(self, flags, row):
+        if row.name not in flags:
+            flags[row.name] = []
+        flags[row.name].append(
+            DatabaseCondition(
+                row.condition, row.value, required=row.required, pk=row.pk
+            )
+        )
+
     def get_flags(self):
         flags = {}
-        for o in self.get_queryset():
-            if o.name not in flags:
-                flags[o.name] = []
-            flags[o.name].append(
-                DatabaseCondition(
-                    o.condition, o.value, required=o.required, obj=o
-                )
+        for row in self._get_rows().iterator(chunk_size=self.chunk_size):
+            self._add_flag_state(flags, row)
+        return flags
+
+    def get_changed_flags(self, flags, since):
+        """Return a copy of flags, as returned by get_flags(), with the
+        FlagState objects saved or deleted since the given datetime applied
+        to it"""
+        FlagState = apps.get_model("flags", "FlagState")
+        FlagStateTombstone = apps.get_model("flags", "FlagStateTombstone")
+
+        # Rows that were saved are removed, wherever they were, and added
+        # again if they still belong to this source
+        removed = set(
+            FlagState.objects.filter(updated_at__gte=since).values_list(
+                "pk", flat=True
             )
+        )
+        removed.update(
+            FlagStateTombstone.objects.filter(
+                deleted_at__gte=since
+            ).values_list("flag_state_pk", flat=True)
+        )
+        rows = list(self._get_rows().filter(updated_at__gte=since))
+
+        changed = {}
+        for name, conditions in flags.items():
+            kept = [c for c in conditions if c.pk not in removed]
+            if kept:
+                changed[name] = kept
+
+        for row in rows:
+            self._add_flag_state(changed, row)
+
+        return changed
+
+    def get_flag(self, flag_name):
+        flags = {}
+        for row in self._get_rows().filter(name=flag_name):
+            self._add_flag_state(flags, row)
+        return flags.get(flag_name)
+
+    async def aget_flags(self):
+        flags = {}
+        async for row in self._get_rows().aiterator(
+            chunk_size=self.chunk_size
+        ):
+            self._add_flag_state(flags, row)
         return flags
 
 
+DEFAULT_FLAG_SOURCES = (
+    "flags.sources.SettingsFlagsSource",
+    "flags.sources.DatabaseFlagsSource",
+)
+
+# Flag source instances live for as long as the process, or until
+# FLAG_SOURCES changes, so that they can keep their own state between calls.
+# _source_instances is keyed by Python path; _flag_sources is the resolved
+# FLAG_SOURCES setting.
+_source_instances = {}
+_flag_sources = None
+
+# The health of each flag source instance
+_source_health = {}
+
+
+class SourceHealth:
+    """The consecutive failures of a flag source, the time until which loads
+    that ignore errors don't call it, and the flags it last gave them"""
+
+    def __init__(self):
+        self.failures = 0
+        self.retry_at = None
+        self.last_flags = None
+
+    def in_backoff(self):
+        return self.retry_at is not None and time.monotonic() < self.retry_at
+
+    def failed(self):
+        self.failures += 1
+
+        # The backoff doubles with each failure in a row, up to a maximum
+        backoff = getattr(settings, "FLAGS_SOURCE_BACKOFF", 1)
+        max_backoff = getattr(settings, "FLAGS_SOURCE_MAX_BACKOFF", 60)
+        self.retry_at = time.monotonic() + min(
+            backoff * 2 ** (self.failures - 1), max_backoff
+        )
+
+    def succeeded(self, flags=None):
+        self.failures = 0
+        self.retry_at = None
+        if flags is not None:
+            self.last_flags = flags
+
+
+def _get_source_health(source_obj):
+    return _source_health.setdefault(source_obj, SourceHealth())
+
+
+def _source_failed(source_obj, exception):
+    health = _get_source_health(source_obj)
+    health.failed()
+
+    # Only the start of an outage is logged, and not as a warning, because
+    # some failures are expected, such as those of the database source in
+    # system checks run before migrations. source_failed is for alerting.
+    if health.failures == 1:
+        logger.info(
+            "Flag source %s failed and is backing off: %r",
+            type(source_obj).__name__,
+            exception,
+        )
+    source_failed.send_robust(
+        sender=type(source_obj),
+        source=source_obj,
+        exception=exception,
+        failures=health.failures,
+    )
+
+
+def get_source(source_str):
+    """Return the instance of the flag source class at the given path"""
+    source_obj = _source_instances.get(source_str)
+    if source_obj is None:
+        source_cls = import_string(source_str)
+        source_obj = _source_instances.setdefault(source_str, source_cls())
+    return source_obj
+
+
+def get_sources():
+    """Return the instances of the flag sources in settings.FLAG_SOURCES"""
+    global _flag_sources
+
+    if _flag_sources is None:
+        _flag_sources = tuple(
+            get_source(source_str)
+            for source_str in getattr(
+                settings, "FLAG_SOURCES", DEFAULT_FLAG_SOURCES
+            )
+        )
+
+    return _flag_sources
+
+
+def _merge_flags(flags, source_flags):
+    """Add the conditions from a flag source to a dict of Flag objects"""
+    for flag, conditions in source_flags.items():
+        if flag in flags:
+            flags[flag].conditions += conditions
+        else:
+            # Sources may hold on to the lists they return
+            flags[flag] = Flag(flag, list(conditions))
+
+
+def _load_source_flags(sources=None, ignore_errors=False):
+    """Return a list of the given sources or FLAG_SOURCES, each with the
+    flags it provides"""
+    source_flags = []
+
+    if sources is None:
+        source_objs = get_sources()
+    else:
+        source_objs = [get_source(source_str) for source_str in sources]
+
+    for source_obj in source_objs:
+        health = _get_source_health(source_obj)
+
+        # Sources in backoff aren't called by loads that ignore errors,
+        # which use the flags the source last gave them, if any, instead.
+        if ignore_errors and health.in_backoff():
+            flags_from_source = health.last_flags
+        else:
+            try:
+                flags_from_source = source_obj.get_flags()
+            except Exception as e:
+                _source_failed(source_obj, e)
+                if not ignore_errors:
+                    raise
+                flags_from_source = health.last_flags
+            else:
+                health.succeeded(flags_from_source if ignore_errors else None)
+
+        if flags_from_source is not None:
+            source_flags.append((source_obj, flags_from_source))
+
+    return source_flags
+
+
+def _merge_source_flags(source_flags):
+    """Merge the flags from each source into a dict of Flag objects"""
+    flags = {}
+    for _, flags_from_source in source_flags:
+        _merge_flags(flags, flags_from_source)
+    return flags
+
+
+def _load_flags(sources=None, ignore_errors=False):
+    """Load and merge the flags from the given sources or FLAG_SOURCES"""
+    return _merge_source_flags(
+        _load_source_flags(sources=sources, ignore_errors=ignore_errors)
+    )
+
+
+def _load_flag(flag_name, sources=None, ignore_errors=False):
+    """Load and merge one flag from the given sources or FLAG_SOURCES, using
+    the get_flag() method of sources that provide one"""
+    flags = {}
+
+    if sources is None:
+        source_objs = get_sources()
+    else:
+        source_objs = [get_source(source_str) for source_str in sources]
+
+    for source_obj in source_objs:
+        health = _get_source_health(source_obj)
+        if ignore_errors and health.in_backoff():
+            conditions = (health.last_flags or {}).get(flag_name)
+        else:
+            try:
+                if hasattr(source_obj, "get_flag"):
+                    conditions = source_obj.get_flag(flag_name)
+                else:
+                    conditions = source_obj.get_flags().get(flag_name)
+            except Exception as e:
+                _source_failed(source_obj, e)
+                if not ignore_errors:
+                    raise
+                conditions = (health.last_flags or {}).get(flag_name)
+            else:
+                health.succeeded()
+
+        if conditions is not None:
+            _merge_flags(flags, {flag_name: conditions})
+
+    return flags.get(flag_name)
+
+
+async def _aload_source_flags(sources=None, ignore_errors=False):
+    """Return a list of the given sources or FLAG_SOURCES, each with the
+    flags it provides, using the aget_flags() method of sources that provide
+    one"""
+    source_flags = []
+
+    if sources is None:
+        source_objs = get_sources()
+    else:
+        source_objs = [get_source(source_str) for source_str in sources]
+
+    for source_obj in source_objs:
+        health = _get_source_health(source_obj)
+        if ignore_errors and health.in_backoff():
+            flags_from_source = health.last_flags
+        else:
+            try:
+                if hasattr(source_obj, "aget_flags"):
+                    flags_from_source = await source_obj.aget_flags()
+                else:
+                    flags_from_source = await sync_to_async(
+                        source_obj.get_flags
+                    )()
+            except Exception as e:
+                _source_failed(source_obj, e)
+                if not ignore_errors:
+                    raise
+                flags_from_source = health.last_flags
+            else:
+                health.succeeded(flags_from_source if ignore_errors else None)
+
+        if flags_from_source is not None:
+            source_flags.append((source_obj, flags_from_source))
+
+    return source_flags
+
+
+async def _aload_flags(sources=None, ignore_errors=False):
+    """Load and merge the flags from the given sources or FLAG_SOURCES,
+    using the aget_flags() method of sources that provide one"""
+    return _merge_source_flags(
+        await _aload_source_flags(sources=sources, ignore_errors=ignore_errors)
+    )
+
+
 def get_flags(sources=None, ignore_errors=False, request=None):
     """Get all flag sources defined in settings.FLAG_SOURCES.
 
@@ -152,44 +881,82 @@ def get_flags(sources=None, ignore_errors=False, request=None):
     If a Django request object is provided, it is used as a place to cache
     flag conditions (as request.flag_conditions) or retrieve them if already
     cached on a previous call.
-    """
-    REQUEST_CACHE_ATTRIBUTE = "flag_conditions"
 
+    If settings.FLAGS_SNAPSHOT_CACHE is True and no explicit sources are
+    given, flags are served from a process-wide snapshot that is rebuilt
+    only when FlagState objects or flag settings change.
+    """
     if request:
         flags = getattr(request, REQUEST_CACHE_ATTRIBUTE, None)
 
-        if flags:
+        # An empty dict of flags is still a cached result
+        if flags is not None:
             return flags
 
-    flags = {}
+    if (
+        sources is None
+        and not ignore_errors
+        and getattr(settings, "FLAGS_SNAPSHOT_CACHE", False)
+    ):
+        from flags.snapshot import get_request_snapshot
 
-    if sources is None:
-        sources = getattr(
-            settings,
-            "FLAG_SOURCES",
-            (
-                "flags.sources.SettingsFlagsSource",
-                "flags.sources.DatabaseFlagsSource",
-            ),
-        )
+        flags = get_request_snapshot(request).flags
+    else:
+        flags = _load_flags(sources=sources, ignore_errors=ignore_errors)
 
-    for source_str in sources:
-        source_cls = import_string(source_str)
-        source_obj = source_cls()
+    if request:
+        setattr(request, REQUEST_CACHE_ATTRIBUTE, flags)
 
-        try:
-            source_flags = source_obj.get_flags()
-        except Exception:
-            if ignore_errors:
-                continue
-            else:
-                raise
+    return flags
 
-        for flag, conditions in source_flags.items():
-            if flag in flags:
-                flags[flag].conditions += conditions
-            else:
-                flags[flag] = Flag(flag, conditions)
+
+def get_flag(flag_name, sources=None, ignore_errors=False, request=None):
+    """Get a single flag from the sources defined in settings.FLAG_SOURCES,
+    or None if no source defines it.
+
+    Flag sources may provide a get_flag() method that returns the list of
+    conditions for one flag, or None, so that the flag can be looked up
+    without getting every flag. Flags cached on the request or in the
+    snapshot are used just as they are by get_flags()."""
+    if request:
+        flags = getattr(request, REQUEST_CACHE_ATTRIBUTE, None)
+
+        if flags is not None:
+            return flags.get(flag_name)
+
+    if (
+        sources is None
+        and not ignore_errors
+        and getattr(settings, "FLAGS_SNAPSHOT_CACHE", False)
+    ):
+        from flags.snapshot import get_request_snapshot
+
+        return get_request_snapshot(request).flags.get(flag_name)
+
+    return _load_flag(flag_name, sources=sources, ignore_errors=ignore_errors)
+
+
+async def aget_flags(sources=None, ignore_errors=False, request=None):
+    """Get all flag sources defined in settings.FLAG_SOURCES without
+    blocking the event loop. See get_flags()."""
+    if request:
+        flags = getattr(request, REQUEST_CACHE_ATTRIBUTE, None)
+
+        if flags is not None:
+            return flags
+
+    if (
+        sources is None
+        and not ignore_errors
+        and getattr(settings, "FLAGS_SNAPSHOT_CACHE", False)
+    ):
+        from flags.snapshot import aget_request_snapshot
+
+        flags = (await aget_request_snapshot(request)).flags
+    else:
+        flags = await _aload_flags(
+            sources=sources, ignore_errors=ignore_errors
+        )
 
     if request:
         setattr(request, REQUEST_CACHE_ATTRIBUTE, flags)
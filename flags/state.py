@@ -1,18 +1,188 @@
+from contextvars import ContextVar
+
 from django.apps import apps
+from django.conf import settings
 from django.core.exceptions import AppRegistryNotReady
 
-from flags.sources import get_flags
+from asgiref.sync import sync_to_async
+
+from flags.snapshot import aget_request_snapshot, get_request_snapshot
+from flags.sources import _check_flags, aget_flags, get_flag, get_flags
+
+
+# Flag states are cached on the request, as request.flag_states, keyed by
+# flag name and any other kwargs given. _MISSING distinguishes a state that
+# has not been cached from a cached None for a non-existent flag.
+REQUEST_CACHE_ATTRIBUTE = "flag_states"
+_MISSING = object()
+
+# The results of pure conditions are shared by all flags checked for a
+# request, as request.flag_condition_results, keyed by the other kwargs
+# given.
+CONDITIONS_CACHE_ATTRIBUTE = "flag_condition_results"
+
+# The flags being checked, and the names of the flags that flag conditions
+# are checking on the way to the current check, so that flag conditions
+# check the same set of flags and stop at cycles.
+_checking = ContextVar("flags_checking", default=(None, frozenset()))
+
+
+def _get_kwargs_cache_key(kwargs):
+    """Return a hashable key for the kwargs other than request, or None if
+    they cannot be hashed"""
+    key = tuple(sorted((k, v) for k, v in kwargs.items() if k != "request"))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _use_precomputed_states():
+    """Precomputed states are used when flags are served from the snapshot,
+    unless each check has to be logged"""
+    return getattr(settings, "FLAGS_SNAPSHOT_CACHE", False) and not getattr(
+        settings, "FLAGS_STATE_LOGGING", False
+    )
+
+
+def _get_flag_states(flag_names, kwargs, flags=None, precomputed=None):
+    """Check the given flags, or all flags, against a single set of flags.
+
+    Flags with a state in precomputed, the states of flags that don't depend
+    on the request, are not checked at all."""
+    request = kwargs.get("request")
+
+    if flags is None and precomputed is None and _use_precomputed_states():
+        snapshot = get_request_snapshot(request)
+        flags, precomputed = snapshot.flags, snapshot.states
+
+    if precomputed is None:
+        precomputed = {}
+
+    if flag_names is None:
+        if flags is None:
+            flags = get_flags(request=request)
+        flag_names = flags.keys()
+
+    cache = kwargs_key = None
+    if request is not None:
+        kwargs_key = _get_kwargs_cache_key(kwargs)
+        cache = getattr(request, REQUEST_CACHE_ATTRIBUTE, None)
+        if cache is None:
+            cache = {}
+            setattr(request, REQUEST_CACHE_ATTRIBUTE, cache)
+
+    states = {}
+    unchecked = []
+    for flag_name in flag_names:
+        state = precomputed.get(flag_name, _MISSING)
+        if state is not _MISSING:
+            states[flag_name] = state
+            continue
+
+        if kwargs_key is not None:
+            state = cache.get((flag_name, kwargs_key), _MISSING)
+            if state is not _MISSING:
+                states[flag_name] = state
+                continue
+
+        unchecked.append(flag_name)
+
+    if unchecked:
+        lookup = flags
+        if flags is None and request is None and len(unchecked) == 1:
+            # A single flag checked outside of a request is looked up on its
+            # own. Flags it depends on are looked up when they are checked.
+            flag = get_flag(unchecked[0])
+            lookup = {} if flag is None else {flag.name: flag}
+        elif flags is None:
+            flags = lookup = get_flags(request=request)
+
+        memo = {}
+        if kwargs_key is not None:
+            memos = getattr(request, CONDITIONS_CACHE_ATTRIBUTE, None)
+            if memos is None:
+                memos = {}
+                setattr(request, CONDITIONS_CACHE_ATTRIBUTE, memos)
+            memo = memos.setdefault(kwargs_key, memo)
+
+        # Flags that don't exist have a state of None
+        token = _checking.set((flags, _checking.get()[1]))
+        try:
+            checked = _check_flags(
+                [lookup[name] for name in unchecked if name in lookup],
+                kwargs,
+                memo,
+            )
+        finally:
+            _checking.reset(token)
+
+        for flag_name in unchecked:
+            state = checked.get(flag_name)
+            if kwargs_key is not None:
+                cache[(flag_name, kwargs_key)] = state
+            states[flag_name] = state
+
+    return states
+
+
+def _get_dependency_state(flag_name, kwargs):
+    """Check a flag that a flag condition depends on, with the same flags
+    and kwargs as the flag being checked"""
+    flags, path = _checking.get()
+
+    # Flags that depend on themselves are reported by the flags.E003 check
+    if flag_name in path:
+        return False
+
+    token = _checking.set((flags, path | {flag_name}))
+    try:
+        return _get_flag_states((flag_name,), kwargs, flags=flags)[flag_name]
+    finally:
+        _checking.reset(token)
 
 
 def _get_flag_state(flag_name, **kwargs):
     """A private function that performs the actual state checking"""
-    flags = get_flags(request=kwargs.get("request"))
+    return _get_flag_states((flag_name,), kwargs)[flag_name]
+
 
-    flag = flags.get(flag_name)
-    if flag is not None:
-        return flag.check_state(**kwargs)
+async def _aget_flag_states(flag_names, kwargs):
+    """Check the given flags, or all flags, without blocking the event
+    loop"""
+    request = kwargs.get("request")
 
-    return None
+    precomputed = None
+    if _use_precomputed_states():
+        snapshot = await aget_request_snapshot(request)
+        flags, precomputed = snapshot.flags, snapshot.states
+
+        # Precomputed states don't need any conditions checked
+        if flag_names is not None and all(
+            name in precomputed for name in flag_names
+        ):
+            return {name: precomputed[name] for name in flag_names}
+    else:
+        flags = await aget_flags(request=request)
+
+    # Conditions may do synchronous I/O, such as loading a lazy
+    # request.user, so they are checked outside of the event loop
+    return await sync_to_async(_get_flag_states)(
+        flag_names, kwargs, flags=flags, precomputed=precomputed
+    )
+
+
+def _clear_request_cache(request):
+    """Remove cached flags and flag states from the request"""
+    for attribute in (
+        "flag_conditions",
+        "flag_snapshot",
+        REQUEST_CACHE_ATTRIBUTE,
+        CONDITIONS_CACHE_ATTRIBUTE,
+    ):
+        if hasattr(request, attribute):
+            delattr(request, attribute)
 
 
 def _set_flag_state(
@@ -21,8 +191,7 @@ def _set_flag_state(
     """A private function to set a boolean condition to the desired state"""
     from flags.models import FlagState
 
-    flags = get_flags(request=request)
-    flag = flags.get(flag_name)
+    flag = get_flag(flag_name, request=request)
     if flag is None:
         raise KeyError(f"No flag with name {flag_name} exists")
 
@@ -49,18 +218,32 @@ def _set_flag_state(
     boolean_condition_obj.value = state
     boolean_condition_obj.save()
 
+    # Later checks in this request must see the new state
+    if request is not None:
+        _clear_request_cache(request)
 
-def flag_state(flag_name, **kwargs):
-    """Return the value for the flag by passing kwargs to its conditions"""
+
+def _check_apps_ready():
     if not apps.ready:
         raise AppRegistryNotReady(
             "Feature flag state cannot be checked before the app registry "
             "is ready."
         )
 
+
+def flag_state(flag_name, **kwargs):
+    """Return the value for the flag by passing kwargs to its conditions"""
+    _check_apps_ready()
     return _get_flag_state(flag_name, **kwargs)
 
 
+def flag_states(flag_names=None, **kwargs):
+    """Return a dict of flag names and their values for the given flags, or
+    all flags, by passing kwargs to their conditions"""
+    _check_apps_ready()
+    return _get_flag_states(flag_names, kwargs)
+
+
 def flag_enabled(flag_name, **kwargs):
     """Check if a flag is enabled by passing kwargs to its conditions."""
     return flag_state(flag_name, **kwargs)
@@ -71,6 +254,28 @@ def flag_disabled(flag_name, **kwargs):
     return not flag_state(flag_name, **kwargs)
 
 
+async def aflag_state(flag_name, **kwargs):
+    """Asynchronous version of flag_state()"""
+    _check_apps_ready()
+    return (await _aget_flag_states((flag_name,), kwargs))[flag_name]
+
+
+async def aflag_states(flag_names=None, **kwargs):
+    """Asynchronous version of flag_states()"""
+    _check_apps_ready()
+    return await _aget_flag_states(flag_names, kwargs)
+
+
+async def aflag_enabled(flag_name, **kwargs):
+    """Asynchronous version of flag_enabled()"""
+    return await aflag_state(flag_name, **kwargs)
+
+
+async def aflag_disabled(flag_name, **kwargs):
+    """Asynchronous version of flag_disabled()"""
+    return not await aflag_state(flag_name, **kwargs)
+
+
 def enable_flag(flag_name, create_boolean_condition=True, request=None):
     """Add or set a boolean condition to `True`"""
     _set_flag_state(
@@ -2,7 +2,7 @@ from django.apps import apps
 from django.core.checks import Warning
 from django.test import TestCase, override_settings
 
-from flags.checks import flag_conditions_check
+from flags.checks import flag_conditions_check, flag_dependencies_check
 
 
 class TestFlagsConditionsCheck(TestCase):
@@ -23,3 +23,27 @@ class TestFlagsConditionsCheck(TestCase):
         self.assertEqual(len(errors), 1)
         self.assertIsInstance(errors[0], Warning)
         self.assertEqual(errors[0].id, "flags.E002")
+
+
+class TestFlagDependenciesCheck(TestCase):
+    @override_settings(
+        FLAGS={
+            "FLAG_A": [("boolean", True)],
+            "FLAG_B": [("flag", "FLAG_A")],
+        }
+    )
+    def test_check_passes_without_cycles(self):
+        self.assertFalse(flag_dependencies_check(apps.get_app_configs()))
+
+    @override_settings(
+        FLAGS={
+            "FLAG_A": [("flag", "FLAG_B")],
+            "FLAG_B": [("flag", "FLAG_A")],
+        }
+    )
+    def test_check_fails_with_cycle(self):
+        errors = flag_dependencies_check(apps.get_app_configs())
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], Warning)
+        self.assertEqual(errors[0].id, "flags.E003")
+        self.assertIn("FLAG_A -> FLAG_B -> FLAG_A", errors[0].msg)
@@ -1,3 +1,4 @@
+import re
 from datetime import timedelta
 
 from django.contrib.auth import get_user_model
@@ -7,15 +8,27 @@ from django.test import TestCase, override_settings
 from django.utils import timezone
 
 from flags.conditions.conditions import (
+    PathMatcher,
     RequiredForCondition,
+    SharedPathPattern,
     after_date_condition,
     anonymous_condition,
     before_date_condition,
     boolean_condition,
+    date_boundary,
+    flag_condition,
+    index_boolean,
+    index_parameter,
+    index_user,
     parameter_condition,
     path_condition,
+    prepare_boolean,
+    prepare_date,
+    prepare_parameter,
+    share_path_patterns,
     user_condition,
 )
+from flags.sources import Condition
 
 
 class BooleanConditionTestCase(TestCase):
@@ -25,6 +38,9 @@ class BooleanConditionTestCase(TestCase):
     def test_boolean_condition_invalid(self):
         self.assertFalse(boolean_condition(False))
 
+    def test_index_boolean(self):
+        self.assertEqual(index_boolean([True, "false", "on", False])(), 2)
+
     def test_boolean_condition_valid_string(self):
         self.assertTrue(boolean_condition("True"))
         self.assertTrue(boolean_condition("true"))
@@ -36,6 +52,13 @@ class BooleanConditionTestCase(TestCase):
         self.assertTrue(boolean_condition("true"))
         self.assertTrue(boolean_condition("true   "))
 
+    def test_prepare_boolean(self):
+        self.assertIs(prepare_boolean("True"), True)
+        self.assertIs(prepare_boolean(" off "), False)
+        self.assertIs(prepare_boolean(1), True)
+        with self.assertRaises(ValueError):
+            prepare_boolean("foo")
+
     def test_boolean_condition_invalid_string(self):
         self.assertFalse(boolean_condition("False"))
         self.assertFalse(boolean_condition("false"))
@@ -66,6 +89,14 @@ class UserConditionTestCase(TestCase):
         with self.assertRaises(RequiredForCondition):
             user_condition("testuser")
 
+    def test_index_user(self):
+        count = index_user(["testuser", "otheruser", "testuser"])
+        self.assertEqual(count(request=self.request), 2)
+        self.request.user = AnonymousUser()
+        self.assertEqual(count(request=self.request), 0)
+        with self.assertRaises(RequiredForCondition):
+            count()
+
     @override_settings(AUTH_USER_MODEL="testapp.MyUserModel")
     def test_custom_user_model_valid(self):
         user = get_user_model()(identifier="customuser")
@@ -94,6 +125,11 @@ class AnonymousConditionTestCase(TestCase):
         self.request.user = user
         self.assertFalse(anonymous_condition(True, request=self.request))
 
+    def test_anonymous_string(self):
+        self.request.user = AnonymousUser()
+        self.assertTrue(anonymous_condition("true", request=self.request))
+        self.assertFalse(anonymous_condition("False", request=self.request))
+
     def test_request_required(self):
         with self.assertRaises(RequiredForCondition):
             anonymous_condition(True)
@@ -132,6 +168,35 @@ class ParameterConditionTestCase(TestCase):
         self.request.GET = QueryDict("")
         self.assertFalse(parameter_condition("my_flag=", request=self.request))
 
+    def test_parameter_condition_prepared(self):
+        self.request.GET = QueryDict("my_flag=today")
+        self.assertTrue(
+            parameter_condition(("my_flag", "today"), request=self.request)
+        )
+        self.assertFalse(
+            parameter_condition(("my_flag", "True"), request=self.request)
+        )
+
+    def test_index_parameter(self):
+        count = index_parameter(
+            [("my_flag", "True"), ("my_flag", "today"), "other_flag=today"]
+        )
+        self.request.GET = QueryDict("my_flag=today&other_flag=today")
+        self.assertEqual(count(request=self.request), 2)
+        self.request.GET = QueryDict("my_flag=True")
+        self.assertEqual(count(request=self.request), 1)
+        self.request.GET = QueryDict("")
+        self.assertEqual(count(request=self.request), 0)
+        with self.assertRaises(RequiredForCondition):
+            count()
+
+    def test_prepare_parameter(self):
+        self.assertEqual(prepare_parameter("my_flag"), ("my_flag", "True"))
+        self.assertEqual(prepare_parameter("my_flag="), ("my_flag", ""))
+        self.assertEqual(
+            prepare_parameter("my_flag=today"), ("my_flag", "today")
+        )
+
     def test_request_required(self):
         with self.assertRaises(RequiredForCondition):
             parameter_condition("my_flag")
@@ -157,11 +222,117 @@ class PathConditionTestCase(TestCase):
         self.request.path = "/your/path"
         self.assertFalse(path_condition("/my/path", request=self.request))
 
+    def test_path_condition_compiled(self):
+        self.request.path = "/my/path"
+        self.assertTrue(
+            path_condition(re.compile("^/my/"), request=self.request)
+        )
+
+    def test_path_condition_shared(self):
+        self.request.path = "/my/path"
+        matcher = PathMatcher([re.compile("^/my/"), re.compile("^/your/")])
+        self.assertTrue(
+            path_condition(
+                SharedPathPattern(matcher, re.compile("^/my/")),
+                request=self.request,
+            )
+        )
+        self.assertFalse(
+            path_condition(
+                SharedPathPattern(matcher, re.compile("^/your/")),
+                request=self.request,
+            )
+        )
+
+    def test_shared_path_pattern_eq(self):
+        pattern = re.compile("^/my/")
+        shared = SharedPathPattern(PathMatcher([pattern]), pattern)
+        other = SharedPathPattern(PathMatcher([pattern]), pattern)
+        self.assertEqual(shared, other)
+        self.assertEqual(hash(shared), hash(other))
+        self.assertNotEqual(
+            shared, SharedPathPattern(shared.matcher, re.compile("^/your/"))
+        )
+        self.assertNotEqual(shared, pattern)
+
     def test_request_required(self):
         with self.assertRaises(RequiredForCondition):
             path_condition("/my/path")
 
 
+class PathMatcherTestCase(TestCase):
+    def assertMatchesLikeSearch(self, patterns, paths):
+        compiled = [re.compile(p) for p in patterns]
+        matcher = PathMatcher(compiled)
+        for path in paths:
+            with self.subTest(path=path):
+                self.assertEqual(
+                    matcher.matches(path),
+                    {p for p in compiled if p.search(path)},
+                )
+
+    def test_combined_patterns(self):
+        patterns = ["^/my/", "path$", r"\bto\b", "^$", "/(a|b)/", "(?<=/)c"]
+        matcher = PathMatcher([re.compile(p) for p in patterns])
+        self.assertEqual(len(matcher.group_patterns), len(patterns))
+        self.assertEqual(matcher.individual_patterns, [])
+        self.assertMatchesLikeSearch(
+            patterns,
+            ["", "/my/path", "/my/path/to/", "/a/path", "/c", "/b/toe/"],
+        )
+
+    def test_individual_patterns(self):
+        patterns = ["(?i)^/MY/", "(?P<name>a)", r"(b)\1", "(?P<p0>c)"]
+        matcher = PathMatcher([re.compile(p) for p in patterns])
+        self.assertEqual(matcher.group_patterns, {})
+        self.assertEqual(len(matcher.individual_patterns), len(patterns))
+        self.assertMatchesLikeSearch(patterns, ["/my/", "/a/", "/bb/", "/c"])
+
+    def test_conditional_group_reference_searched_individually(self):
+        patterns = ["x", "(y)?(?(1)z|b)"]
+        matcher = PathMatcher([re.compile(p) for p in patterns])
+        self.assertEqual(len(matcher.group_patterns), 1)
+        self.assertEqual(len(matcher.individual_patterns), 1)
+        self.assertMatchesLikeSearch(patterns, ["/xb", "/yz", "/yb"])
+
+    def test_mixed_patterns(self):
+        self.assertMatchesLikeSearch(
+            ["^/my/", "(?i)PATH", "^/my/"],
+            ["/my/path", "/your/PATH", "/other"],
+        )
+
+    def test_no_patterns(self):
+        self.assertEqual(PathMatcher([]).matches("/my/path"), frozenset())
+
+    def test_matches_cached(self):
+        matcher = PathMatcher([re.compile("^/my/")])
+        matcher.matches("/my/path")
+        matcher.matches("/my/path")
+        self.assertEqual(matcher.matches.cache_info().hits, 1)
+
+    def test_share_path_patterns(self):
+        conditions = [
+            Condition("path matches", "^/my/"),
+            Condition("path matches", "^/my/"),
+            Condition("path matches", "["),
+            Condition("boolean", True),
+        ]
+        matcher = share_path_patterns(conditions)
+        self.assertEqual(len(matcher.group_patterns), 1)
+        self.assertIsInstance(conditions[0].prepared_value, SharedPathPattern)
+        self.assertIs(conditions[0].prepared_value.matcher, matcher)
+        self.assertIs(conditions[1].prepared_value.matcher, matcher)
+        self.assertEqual(conditions[2].prepared_value, "[")
+        self.assertIs(conditions[3].prepared_value, True)
+
+        # Sharing again replaces the matcher
+        new_matcher = share_path_patterns(conditions)
+        self.assertIs(conditions[0].prepared_value.matcher, new_matcher)
+        self.assertEqual(
+            conditions[0].prepared_value.pattern, re.compile("^/my/")
+        )
+
+
 class AfterDateConditionTestCase(TestCase):
     def setUp(self):
         # Set up some datetimes relative to now for testing
@@ -188,6 +359,24 @@ class AfterDateConditionTestCase(TestCase):
     def test_not_valid_date_str(self):
         self.assertFalse(after_date_condition("I am not a valid date"))
 
+    def test_date_boundary(self):
+        self.assertEqual(
+            date_boundary(self.past_datetime_tz), self.past_datetime_tz
+        )
+        self.assertIsNone(
+            date_boundary(self.past_datetime_tz.replace(tzinfo=None))
+        )
+        self.assertIsNone(date_boundary("not a date"))
+
+    def test_prepare_date(self):
+        self.assertEqual(
+            prepare_date(self.past_datetime_tz_str), self.past_datetime_tz
+        )
+        self.assertEqual(
+            prepare_date(self.past_datetime_tz), self.past_datetime_tz
+        )
+        self.assertEqual(prepare_date("not a date"), "not a date")
+
 
 class BeforeDateConditionTestCase(TestCase):
     def setUp(self):
@@ -214,3 +403,30 @@ class BeforeDateConditionTestCase(TestCase):
 
     def test_not_valid_date_str(self):
         self.assertFalse(before_date_condition("I am not a valid date"))
+
+
+@override_settings(
+    FLAGS={
+        "UPSTREAM_ENABLED": [("boolean", True)],
+        "UPSTREAM_DISABLED": [("boolean", False)],
+        "UPSTREAM_PATH": [("path matches", "^/my/")],
+    }
+)
+class FlagConditionTestCase(TestCase):
+    def test_flag_enabled(self):
+        self.assertTrue(flag_condition("UPSTREAM_ENABLED"))
+
+    def test_flag_disabled(self):
+        self.assertFalse(flag_condition("UPSTREAM_DISABLED"))
+
+    def test_flag_does_not_exist(self):
+        self.assertFalse(flag_condition("UPSTREAM_DOES_NOT_EXIST"))
+
+    def test_flag_checked_with_kwargs(self):
+        request = HttpRequest()
+        request.path = "/my/path"
+        self.assertTrue(flag_condition("UPSTREAM_PATH", request=request))
+
+        request = HttpRequest()
+        request.path = "/your/path"
+        self.assertFalse(flag_condition("UPSTREAM_PATH", request=request))
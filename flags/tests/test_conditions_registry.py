@@ -25,6 +25,102 @@ class ConditionRegistryTestCase(TestCase):
         self.assertEqual(_conditions["undecorated"], fn)
         self.assertEqual(_conditions["undecorated"].validate, validator)
 
+    def test_register_prepare(self):
+        fn = lambda conditional_value: True
+        prepare = lambda value: value.upper()
+        register("prepared", fn=fn, prepare=prepare)
+        self.assertEqual(_conditions["prepared"].prepare, prepare)
+
+    def test_register_prepare_decorator(self):
+        fn = lambda conditional_value: True
+        prepare = lambda value: value.upper()
+        register("decorated prepared", prepare=prepare)(fn)
+        self.assertEqual(_conditions["decorated prepared"].prepare, prepare)
+
+    def test_register_prepare_attribute(self):
+        class PreparedCondition:
+            def __call__(self, conditional_value):
+                return True  # pragma: no cover
+
+            def prepare(self, value):
+                return value  # pragma: no cover
+
+        fn = PreparedCondition()
+        register("prepared attribute", fn=fn)
+        self.assertEqual(_conditions["prepared attribute"].prepare, fn.prepare)
+
+    def test_register_no_prepare(self):
+        fn = lambda conditional_value: True
+        register("unprepared", fn=fn)
+        self.assertIsNone(_conditions["unprepared"].prepare)
+
+    def test_register_requires_boundary(self):
+        fn = lambda conditional_value: True
+        boundary = lambda value: None
+        register("bounded", fn=fn, requires=(), boundary=boundary)
+        self.assertEqual(_conditions["bounded"].requires, ())
+        self.assertEqual(_conditions["bounded"].boundary, boundary)
+
+    def test_register_index(self):
+        fn = lambda conditional_value: True
+        index = lambda values: lambda **kwargs: 0
+        register("indexed", fn=fn, index=index)
+        self.assertEqual(_conditions["indexed"].index, index)
+
+    def test_register_batch(self):
+        fn = lambda conditional_value: True
+        batch = lambda values, **kwargs: [True for value in values]
+        register("batched", fn=fn, batch=batch)
+        self.assertEqual(_conditions["batched"].batch, batch)
+
+    def test_register_batch_decorator(self):
+        batch = lambda values, **kwargs: [True for value in values]
+
+        @register("decorated batched", batch=batch)
+        def fn(conditional_value):
+            return True  # pragma: no cover
+
+        self.assertEqual(_conditions["decorated batched"].batch, batch)
+
+    def test_register_cache_metadata(self):
+        fn = lambda conditional_value: True
+        register("cached", fn=fn, pure=True, cache_scope="user", ttl=60)
+        self.assertTrue(_conditions["cached"].pure)
+        self.assertEqual(_conditions["cached"].cache_scope, "user")
+        self.assertEqual(_conditions["cached"].ttl, 60)
+
+    def test_register_cost(self):
+        register("costly", fn=lambda conditional_value: True, cost=100)
+        self.assertEqual(_conditions["costly"].cost, 100)
+
+    def test_register_invalid_cache_scope(self):
+        with self.assertRaises(ValueError):
+            register("badly cached", fn=lambda value: value, cache_scope="x")
+        self.assertNotIn("badly cached", _conditions)
+
+    def test_builtin_condition_metadata(self):
+        for name, requires, pure, cache_scope in (
+            ("boolean", (), True, "process"),
+            ("user", ("request",), True, "user"),
+            ("anonymous", ("request",), True, "user"),
+            ("parameter", ("request",), True, "request"),
+            ("path matches", ("request",), True, "request"),
+            ("after date", (), False, "request"),
+            ("before date", (), False, "request"),
+        ):
+            with self.subTest(name=name):
+                condition = get_condition(name)
+                self.assertEqual(condition.requires, requires)
+                self.assertIs(condition.pure, pure)
+                self.assertEqual(condition.cache_scope, cache_scope)
+                self.assertIsNone(condition.ttl)
+
+    def test_register_no_requires_boundary(self):
+        fn = lambda conditional_value: True
+        register("unbounded", fn=fn)
+        self.assertIsNone(_conditions["unbounded"].requires)
+        self.assertIsNone(_conditions["unbounded"].boundary)
+
     def test_register_dup_condition(self):
         with self.assertRaises(DuplicateCondition):
             register("boolean", fn=lambda value: value)
@@ -5,6 +5,7 @@ from django.test import TestCase, override_settings
 from flags.conditions.validators import (
     validate_boolean,
     validate_date,
+    validate_flag,
     validate_parameter,
     validate_path_re,
     validate_user,
@@ -91,3 +92,12 @@ class ValidateDateTestCase(TestCase):
     def test_valid_date_strings(self):
         validate_date("2020-04-01T12:00")
         validate_date("2020-04-01T12:00+04:00")
+
+
+class ValidateFlagTestCase(TestCase):
+    def test_existing_flag(self):
+        validate_flag("FLAG_ENABLED")
+
+    def test_non_existent_flag(self):
+        with self.assertRaises(ValidationError):
+            validate_flag("FLAG_DOES_NOT_EXIST")
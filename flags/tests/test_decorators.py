@@ -1,8 +1,12 @@
 import warnings
 from unittest.mock import Mock
 
+from django.contrib.auth.models import User
 from django.http import Http404, HttpRequest, HttpResponse
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.utils.functional import SimpleLazyObject
+
+from asgiref.sync import iscoroutinefunction
 
 from flags.decorators import flag_check, flag_required
 
@@ -113,3 +117,62 @@ class FlagCheckTestCase(TestCase):
         decorated = decorator(view)
         response = decorated(self.request, "an extra argument", kwarg="foo")
         self.assertContains(response, "fallback")
+
+
+async def async_view(request):
+    return HttpResponse("ok")
+
+
+class AsyncFlagCheckTestCase(TestCase):
+    def setUp(self):
+        self.request = HttpRequest()
+        self.view = async_view
+
+    def test_decorated_coroutine_view_is_coroutine(self):
+        decorated = flag_check("FLAG_ENABLED", True)(self.view)
+        self.assertTrue(iscoroutinefunction(decorated))
+
+    async def test_decorated_flag_enabled(self):
+        decorated = flag_check("FLAG_ENABLED", True)(self.view)
+        response = await decorated(self.request)
+        self.assertContains(response, "ok")
+
+    async def test_decorated_flag_disabled(self):
+        decorated = flag_check("FLAG_DISABLED", True)(self.view)
+        with self.assertRaises(Http404):
+            await decorated(self.request)
+
+    async def test_decorated_lazy_user(self):
+        await User.objects.acreate(username="bob")
+        self.request.user = SimpleLazyObject(
+            lambda: User.objects.get(username="bob")
+        )
+        decorated = flag_check("USER_FLAG", True)(self.view)
+        with override_settings(FLAGS={"USER_FLAG": [("user", "bob")]}):
+            response = await decorated(self.request)
+        self.assertContains(response, "ok")
+
+    async def test_coroutine_fallback_view(self):
+        async def fallback(request):
+            return HttpResponse("fallback")
+
+        decorated = flag_check("FLAG_DISABLED", True, fallback=fallback)(
+            self.view
+        )
+        response = await decorated(self.request)
+        self.assertContains(response, "fallback")
+
+    async def test_sync_fallback_view(self):
+        def fallback(request):
+            return HttpResponse("fallback")
+
+        decorated = flag_check("FLAG_DISABLED", True, fallback=fallback)(
+            self.view
+        )
+        response = await decorated(self.request)
+        self.assertContains(response, "fallback")
+
+    async def test_flag_required(self):
+        decorated = flag_required("FLAG_ENABLED")(self.view)
+        response = await decorated(self.request)
+        self.assertContains(response, "ok")
@@ -1,6 +1,8 @@
+import datetime
+
 from django.test import TestCase
 
-from flags.models import FlagState
+from flags.models import FlagState, FlagStateTombstone
 
 
 class FlagStateTestCase(TestCase):
@@ -17,3 +19,16 @@ class FlagStateTestCase(TestCase):
         self.assertEqual(
             str(state), "MY_FLAG is enabled when boolean is True (required)"
         )
+
+
+class FlagStateTombstoneTestCase(TestCase):
+    def test_tombstone_str(self):
+        tombstone = FlagStateTombstone(
+            flag_state_pk=1,
+            deleted_at=datetime.datetime(
+                2026, 1, 1, tzinfo=datetime.timezone.utc
+            ),
+        )
+        self.assertEqual(
+            str(tombstone), "FlagState 1 deleted at 2026-01-01 00:00:00+00:00"
+        )
@@ -0,0 +1,645 @@
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import caches
+from django.http import HttpRequest
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from flags import snapshot as snapshot_module
+from flags.models import FlagState, FlagStateTombstone
+from flags.snapshot import (
+    CONSTANT,
+    DELTA_SYNC_OVERLAP,
+    REQUEST_DEPENDENT,
+    TIME_DEPENDENT,
+    TOMBSTONE_RETENTION,
+    VERSION_CACHE_KEY,
+    _refresh_in_background,
+    _refresh_lock,
+    _start_refresh_thread,
+    aget_snapshot,
+    aget_version,
+    bump_version,
+    get_snapshot,
+    get_version,
+    invalidate_snapshot,
+)
+from flags.sources import _load_source_flags, check_flags, get_flags
+from flags.state import flag_enabled
+
+
+@override_settings(FLAGS_SNAPSHOT_CACHE=True)
+class SnapshotTestCase(TestCase):
+    def setUp(self):
+        invalidate_snapshot()
+
+    def test_get_flags_uses_snapshot(self):
+        with self.assertNumQueries(1):
+            get_flags()
+
+        with self.assertNumQueries(0):
+            flags = get_flags()
+
+        self.assertIs(flags, get_snapshot().flags)
+
+    @override_settings(FLAGS_SNAPSHOT_CACHE=False)
+    def test_get_flags_without_snapshot(self):
+        with self.assertNumQueries(1):
+            get_flags()
+
+        with self.assertNumQueries(1):
+            get_flags()
+
+    def test_snapshot_is_immutable(self):
+        flags = get_flags()
+        with self.assertRaises(TypeError):
+            flags["NEW_FLAG"] = None
+
+    def test_explicit_sources_bypass_snapshot(self):
+        get_flags()
+        with self.assertNumQueries(1):
+            get_flags(sources=["flags.sources.DatabaseFlagsSource"])
+
+    def test_ignore_errors_bypasses_snapshot(self):
+        get_flags()
+        with self.assertNumQueries(1):
+            get_flags(ignore_errors=True)
+
+    def test_flag_state_saved_invalidates_snapshot(self):
+        self.assertFalse(flag_enabled("DB_FLAG"))
+        FlagState.objects.create(
+            name="DB_FLAG", condition="boolean", value="True"
+        )
+        self.assertTrue(flag_enabled("DB_FLAG"))
+
+    def test_flag_state_deleted_invalidates_snapshot(self):
+        obj = FlagState.objects.create(
+            name="DB_ONLY_FLAG", condition="boolean", value="True"
+        )
+        self.assertIn("DB_ONLY_FLAG", get_flags())
+        obj.delete()
+        self.assertNotIn("DB_ONLY_FLAG", get_flags())
+
+    def test_setting_changed_invalidates_snapshot(self):
+        self.assertNotIn("OVERRIDDEN_FLAG", get_flags())
+        with override_settings(FLAGS={"OVERRIDDEN_FLAG": []}):
+            self.assertIn("OVERRIDDEN_FLAG", get_flags())
+        self.assertNotIn("OVERRIDDEN_FLAG", get_flags())
+
+    @override_settings(
+        FLAGS={
+            "MY_PATH_FLAG": [("path matches", "^/my/")],
+            "YOUR_PATH_FLAG": [("path matches", "^/your/")],
+        }
+    )
+    def test_snapshot_shares_path_matcher(self):
+        request = HttpRequest()
+        request.path = "/my/path"
+        self.assertTrue(flag_enabled("MY_PATH_FLAG", request=request))
+        self.assertFalse(flag_enabled("YOUR_PATH_FLAG", request=request))
+
+        matcher = get_snapshot().path_matcher
+        self.assertEqual(len(matcher.group_patterns), 2)
+        self.assertEqual(matcher.matches.cache_info().misses, 1)
+
+    def test_request_independent_flags_precomputed(self):
+        future = timezone.now() + timedelta(days=1)
+        with override_settings(
+            FLAGS={
+                "DATE_FLAG": [("before date", future)],
+                "PATH_FLAG": [("path matches", "^/my/")],
+            }
+        ):
+            snapshot = get_snapshot()
+            self.assertEqual(snapshot.expires_at, future.timestamp())
+
+            with mock.patch("flags.conditions.conditions.timezone") as tz:
+                self.assertTrue(flag_enabled("DATE_FLAG"))
+                tz.now.assert_not_called()
+
+    def test_flag_kinds(self):
+        past = timezone.now() - timedelta(days=1)
+        future = timezone.now() + timedelta(days=1)
+        with override_settings(
+            FLAGS={
+                "BOOLEAN_FLAG": [("boolean", True)],
+                "PAST_DATE_FLAG": [("after date", past)],
+                "DATE_FLAG": [("before date", future)],
+                "PATH_FLAG": [("boolean", True), ("path matches", "^/my/")],
+            }
+        ):
+            snapshot = get_snapshot()
+
+        self.assertEqual(
+            dict(snapshot.kinds),
+            {
+                "BOOLEAN_FLAG": CONSTANT,
+                "PAST_DATE_FLAG": CONSTANT,
+                "DATE_FLAG": TIME_DEPENDENT,
+                "PATH_FLAG": REQUEST_DEPENDENT,
+            },
+        )
+        self.assertEqual(
+            dict(snapshot.states),
+            {
+                "BOOLEAN_FLAG": True,
+                "PAST_DATE_FLAG": True,
+                "DATE_FLAG": True,
+            },
+        )
+
+    def test_precomputed_flags_not_batched(self):
+        batch = mock.Mock(
+            side_effect=lambda values, tiers=(), **kwargs: [
+                value in tiers for value in values
+            ]
+        )
+        fn = mock.Mock(
+            side_effect=lambda value, tiers=(), **kwargs: value in tiers,
+            batch=batch,
+            prepare=None,
+            requires=(),
+            pure=True,
+            boundary=None,
+            index=None,
+            cost=None,
+        )
+        flags_setting = {
+            "CONSTANT_FLAG": [("tier", 1)],
+            "FLAG_A": [("tier", 2), ("path matches", "^/a/")],
+            "FLAG_B": [("tier", 3), ("path matches", "^/b/")],
+        }
+        with (
+            mock.patch.dict(
+                "flags.conditions.registry._conditions", {"tier": fn}
+            ),
+            override_settings(FLAGS=flags_setting),
+        ):
+            snapshot = get_snapshot()
+            self.assertEqual(snapshot.states, {"CONSTANT_FLAG": False})
+            fn.reset_mock()
+
+            states = check_flags(
+                list(snapshot.flags.values()),
+                request=HttpRequest(),
+                tiers={1, 2},
+            )
+
+        self.assertEqual(
+            states, {"CONSTANT_FLAG": False, "FLAG_A": True, "FLAG_B": False}
+        )
+        batch.assert_called_once_with([2, 3], request=mock.ANY, tiers={1, 2})
+        fn.assert_not_called()
+
+    def test_flag_that_fails_to_precompute(self):
+        with override_settings(
+            FLAGS={
+                "GOOD": [("boolean", True)],
+                "BAD": [("boolean", "maybe")],
+            }
+        ):
+            snapshot = get_snapshot()
+            self.assertEqual(snapshot.kinds["BAD"], REQUEST_DEPENDENT)
+            self.assertNotIn("BAD", snapshot.states)
+            self.assertTrue(flag_enabled("GOOD"))
+            with self.assertRaises(ValueError):
+                flag_enabled("BAD")
+
+    def test_snapshot_without_boundaries_does_not_expire(self):
+        with override_settings(FLAGS={"MY_FLAG": [("boolean", True)]}):
+            self.assertIsNone(get_snapshot().expires_at)
+
+    def test_snapshot_refreshed_at_boundary(self):
+        future = timezone.now() + timedelta(days=1)
+        with override_settings(FLAGS={"DATE_FLAG": [("after date", future)]}):
+            snapshot = get_snapshot()
+            self.assertFalse(flag_enabled("DATE_FLAG"))
+
+            later = future + timedelta(seconds=1)
+            with (
+                mock.patch("flags.snapshot.time.time") as time,
+                mock.patch("flags.conditions.conditions.timezone.now") as now,
+                self.assertNumQueries(0),
+            ):
+                time.return_value = later.timestamp()
+                now.return_value = later
+                self.assertTrue(flag_enabled("DATE_FLAG"))
+
+            self.assertIsNot(get_snapshot(), snapshot)
+            self.assertIsNone(get_snapshot().expires_at)
+
+    async def test_aget_snapshot_refreshed_at_boundary(self):
+        future = timezone.now() + timedelta(days=1)
+        with override_settings(FLAGS={"DATE_FLAG": [("after date", future)]}):
+            snapshot = await aget_snapshot()
+
+            with mock.patch("flags.snapshot.time.time") as time:
+                time.return_value = future.timestamp()
+                self.assertIsNot(await aget_snapshot(), snapshot)
+
+    def test_snapshot_discarded_if_invalidated_while_building(self):
+        def load_source_flags():
+            invalidate_snapshot()
+            return []
+
+        with mock.patch(
+            "flags.snapshot._load_source_flags", side_effect=load_source_flags
+        ):
+            snapshot = get_snapshot()
+
+        self.assertIsNot(snapshot, get_snapshot())
+
+
+@override_settings(
+    FLAGS_SNAPSHOT_CACHE=True,
+    FLAGS_SNAPSHOT_CACHE_ALIAS="flags",
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+        "flags": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "flags",
+        },
+    },
+)
+class VersionedSnapshotTestCase(TestCase):
+    def setUp(self):
+        caches["flags"].clear()
+        invalidate_snapshot()
+
+    def test_get_version_without_alias(self):
+        with override_settings(FLAGS_SNAPSHOT_CACHE_ALIAS=None):
+            self.assertIsNone(get_version())
+            bump_version()
+            self.assertIsNone(get_version())
+
+    def test_get_version_initializes_key(self):
+        self.assertIsNone(caches["flags"].get(VERSION_CACHE_KEY))
+        version = get_version()
+        self.assertIsNotNone(version)
+        self.assertEqual(get_version(), version)
+
+    def test_bump_version(self):
+        version = get_version()
+        bump_version()
+        self.assertEqual(get_version(), version + 1)
+
+    def test_bump_version_missing_key(self):
+        bump_version()
+        self.assertIsNotNone(caches["flags"].get(VERSION_CACHE_KEY))
+
+    def test_snapshot_rebuilt_when_version_moves(self):
+        snapshot = get_snapshot()
+        self.assertIs(get_snapshot(), snapshot)
+
+        # Another process changes the flags
+        caches["flags"].incr(VERSION_CACHE_KEY)
+
+        self.assertIsNot(get_snapshot(), snapshot)
+
+    async def test_aget_snapshot_rebuilt_when_version_moves(self):
+        snapshot = await aget_snapshot()
+        self.assertIs(await aget_snapshot(), snapshot)
+
+        await caches["flags"].aincr(VERSION_CACHE_KEY)
+
+        self.assertIsNot(await aget_snapshot(), snapshot)
+
+    async def test_aget_version_initializes_key(self):
+        version = await aget_version()
+        self.assertIsNotNone(version)
+        self.assertEqual(await aget_version(), version)
+
+    async def test_aget_version_without_alias(self):
+        with override_settings(FLAGS_SNAPSHOT_CACHE_ALIAS=None):
+            self.assertIsNone(await aget_version())
+
+    def test_snapshot_rebuilt_when_version_evicted(self):
+        snapshot = get_snapshot()
+        caches["flags"].delete(VERSION_CACHE_KEY)
+        self.assertIsNot(get_snapshot(), snapshot)
+
+    @override_settings(FLAGS_SNAPSHOT_VERSION_CHECK_INTERVAL=60)
+    def test_version_check_interval(self):
+        snapshot = get_snapshot()
+        caches["flags"].incr(VERSION_CACHE_KEY)
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_snapshot(), snapshot)
+
+        with mock.patch(
+            "flags.snapshot.time.monotonic",
+            return_value=snapshot.checked_at + 61,
+        ):
+            self.assertIsNot(get_snapshot(), snapshot)
+
+    def test_flag_state_change_bumps_version_on_commit(self):
+        version = get_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FlagState.objects.create(
+                name="DB_FLAG", condition="boolean", value="True"
+            )
+            self.assertEqual(get_version(), version)
+
+        self.assertEqual(get_version(), version + 1)
+
+
+@override_settings(
+    FLAGS_SNAPSHOT_CACHE=True,
+    FLAGS_SNAPSHOT_CACHE_ALIAS="flags",
+    FLAGS_SNAPSHOT_BACKGROUND_REFRESH=True,
+    FLAGS_SNAPSHOT_MAX_STALENESS=10,
+    FLAG_SOURCES=["flags.sources.SettingsFlagsSource"],
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+        "flags": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "flags",
+        },
+    },
+)
+class BackgroundRefreshSnapshotTestCase(TestCase):
+    def setUp(self):
+        caches["flags"].clear()
+        invalidate_snapshot()
+        self.snapshot = get_snapshot()
+
+        patcher = mock.patch("flags.snapshot._start_refresh_thread")
+        self.start_refresh = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.release_refresh_lock)
+
+    def release_refresh_lock(self):
+        if _refresh_lock.locked():
+            _refresh_lock.release()
+
+    def run_refresh(self):
+        _refresh_in_background(*self.start_refresh.call_args.args)
+
+    def test_stale_snapshot_served_while_refreshing(self):
+        caches["flags"].incr(VERSION_CACHE_KEY)
+
+        self.assertIs(get_snapshot(), self.snapshot)
+        self.assertIs(get_snapshot(), self.snapshot)
+        self.start_refresh.assert_called_once_with(self.snapshot)
+
+        self.run_refresh()
+        self.assertFalse(_refresh_lock.locked())
+        snapshot = get_snapshot()
+        self.assertIsNot(snapshot, self.snapshot)
+        self.assertEqual(snapshot.version, get_version())
+
+    async def test_aget_snapshot_serves_stale_snapshot(self):
+        await caches["flags"].aincr(VERSION_CACHE_KEY)
+        self.assertIs(await aget_snapshot(), self.snapshot)
+        self.start_refresh.assert_called_once()
+
+    def test_snapshot_rebuilt_after_max_staleness(self):
+        caches["flags"].incr(VERSION_CACHE_KEY)
+        now = time.monotonic()
+
+        with mock.patch("flags.snapshot.time.monotonic") as monotonic:
+            monotonic.return_value = now
+            self.assertIs(get_snapshot(), self.snapshot)
+            self.assertEqual(self.snapshot.stale_since, now)
+
+            monotonic.return_value = now + 10
+            self.assertIs(get_snapshot(), self.snapshot)
+            self.assertIs(snapshot_module._snapshot, self.snapshot)
+
+            monotonic.return_value = now + 11
+            snapshot = get_snapshot()
+
+        self.assertIsNot(snapshot, self.snapshot)
+        self.assertEqual(snapshot.version, get_version())
+        self.assertIs(snapshot_module._snapshot, snapshot)
+        self.start_refresh.assert_called_once()
+
+    def test_failed_refresh_thread_start_releases_lock(self):
+        self.start_refresh.side_effect = RuntimeError
+        caches["flags"].incr(VERSION_CACHE_KEY)
+
+        with self.assertRaises(RuntimeError):
+            get_snapshot()
+
+        self.assertFalse(_refresh_lock.locked())
+
+    def test_invalidated_snapshot_rebuilt_immediately(self):
+        invalidate_snapshot()
+        self.assertIsNot(get_snapshot(), self.snapshot)
+        self.start_refresh.assert_not_called()
+
+    def test_failed_refresh_logged(self):
+        caches["flags"].incr(VERSION_CACHE_KEY)
+        get_snapshot()
+
+        with (
+            mock.patch(
+                "flags.snapshot._load_snapshot", side_effect=ValueError
+            ),
+            self.assertLogs("flags.snapshot", level="ERROR"),
+        ):
+            self.run_refresh()
+
+        self.assertFalse(_refresh_lock.locked())
+        self.assertIs(get_snapshot(), self.snapshot)
+
+    def test_without_background_refresh(self):
+        with override_settings(FLAGS_SNAPSHOT_BACKGROUND_REFRESH=False):
+            snapshot = get_snapshot()
+            caches["flags"].incr(VERSION_CACHE_KEY)
+            self.assertIsNot(get_snapshot(), snapshot)
+        self.start_refresh.assert_not_called()
+
+    def test_refreshed_in_thread(self):
+        self.start_refresh.side_effect = _start_refresh_thread
+        caches["flags"].incr(VERSION_CACHE_KEY)
+
+        with mock.patch("flags.snapshot.connections") as connections:
+            self.assertIs(get_snapshot(), self.snapshot)
+            # The lock is held until the refresh thread has finished
+            with _refresh_lock:
+                pass
+
+        connections.close_all.assert_called_once()
+        self.assertIsNot(get_snapshot(), self.snapshot)
+
+
+class FileBasedVersionedSnapshotTestCase(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+        settings_override = override_settings(
+            FLAGS_SNAPSHOT_CACHE=True,
+            FLAGS_SNAPSHOT_CACHE_ALIAS="flags",
+            CACHES={
+                "default": {
+                    "BACKEND": (
+                        "django.core.cache.backends.locmem.LocMemCache"
+                    ),
+                },
+                "flags": {
+                    "BACKEND": (
+                        "django.core.cache.backends.filebased.FileBasedCache"
+                    ),
+                    "LOCATION": self.cache_dir,
+                },
+            },
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_snapshot_rebuilt_when_version_moves(self):
+        snapshot = get_snapshot()
+        self.assertIs(get_snapshot(), snapshot)
+
+        caches["flags"].incr(VERSION_CACHE_KEY)
+
+        self.assertIsNot(get_snapshot(), snapshot)
+
+
+@override_settings(
+    FLAGS_SNAPSHOT_CACHE=True,
+    FLAGS_SNAPSHOT_DELTA_SYNC=True,
+    FLAGS={"SETTINGS_FLAG": [("boolean", True)]},
+)
+class DeltaSyncSnapshotTestCase(TestCase):
+    def setUp(self):
+        invalidate_snapshot()
+        self.obj = FlagState.objects.create(
+            name="DB_FLAG", condition="boolean", value="False"
+        )
+        self.snapshot = get_snapshot()
+
+        patcher = mock.patch(
+            "flags.snapshot._load_source_flags", wraps=_load_source_flags
+        )
+        self.load_source_flags = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_values(self, flag_name):
+        flag = get_snapshot().flags.get(flag_name)
+        if flag is not None:
+            return sorted(c.value for c in flag.conditions)
+
+    def test_saved_flag_state_applied(self):
+        FlagState.objects.create(
+            name="DB_FLAG", condition="parameter", value="db_flag"
+        )
+        FlagState.objects.create(
+            name="NEW_FLAG", condition="boolean", value="True"
+        )
+
+        # Changed rows, changed primary keys, and tombstones
+        with self.assertNumQueries(3):
+            self.assertEqual(self.get_values("DB_FLAG"), ["False", "db_flag"])
+        self.assertEqual(self.get_values("NEW_FLAG"), ["True"])
+        self.assertEqual(self.get_values("SETTINGS_FLAG"), [True])
+        self.load_source_flags.assert_not_called()
+
+    def test_unchanged_flag_state_carried_over(self):
+        old = FlagState.objects.create(
+            name="OLD_FLAG", condition="boolean", value="True"
+        )
+        FlagState.objects.filter(pk=old.pk).update(
+            updated_at=timezone.now() - 2 * DELTA_SYNC_OVERLAP
+        )
+        invalidate_snapshot()
+        condition = get_snapshot().flags["OLD_FLAG"].conditions[0]
+
+        FlagState.objects.create(
+            name="NEW_FLAG", condition="boolean", value="True"
+        )
+        with self.assertNumQueries(3):
+            snapshot = get_snapshot()
+
+        # The unchanged row is carried over, not fetched again
+        self.assertIs(snapshot.flags["OLD_FLAG"].conditions[0], condition)
+        self.assertIn("NEW_FLAG", snapshot.flags)
+        self.load_source_flags.assert_called_once()
+
+    def test_updated_flag_state_applied(self):
+        self.obj.name = "RENAMED_FLAG"
+        self.obj.value = "True"
+        self.obj.save()
+
+        self.assertIsNone(self.get_values("DB_FLAG"))
+        self.assertEqual(self.get_values("RENAMED_FLAG"), ["True"])
+        self.assertTrue(get_snapshot().states["RENAMED_FLAG"])
+        self.load_source_flags.assert_not_called()
+
+    def test_deleted_flag_state_applied(self):
+        pk = self.obj.pk
+        self.obj.delete()
+
+        self.assertTrue(
+            FlagStateTombstone.objects.filter(flag_state_pk=pk).exists()
+        )
+        self.assertIsNone(self.get_values("DB_FLAG"))
+        self.load_source_flags.assert_not_called()
+
+    def test_old_tombstones_pruned(self):
+        FlagStateTombstone.objects.create(
+            flag_state_pk=0,
+            deleted_at=timezone.now() - TOMBSTONE_RETENTION * 2,
+        )
+        pk = self.obj.pk
+        self.obj.delete()
+        self.assertEqual(
+            list(
+                FlagStateTombstone.objects.values_list(
+                    "flag_state_pk", flat=True
+                )
+            ),
+            [pk],
+        )
+
+    def test_version_change_applied(self):
+        FlagState.objects.filter(pk=self.obj.pk).update(
+            value="True", updated_at=timezone.now()
+        )
+        bump_version()
+
+        self.assertEqual(self.get_values("DB_FLAG"), ["True"])
+        self.load_source_flags.assert_not_called()
+
+    def test_snapshot_older_than_tombstones_loaded_in_full(self):
+        self.snapshot.synced_at -= TOMBSTONE_RETENTION
+        FlagState.objects.create(
+            name="NEW_FLAG", condition="boolean", value="True"
+        )
+
+        self.assertEqual(self.get_values("NEW_FLAG"), ["True"])
+        self.load_source_flags.assert_called_once()
+
+    def test_setting_changed_loaded_in_full(self):
+        with override_settings(FLAGS={"OTHER_FLAG": [("boolean", True)]}):
+            self.assertIsNone(self.get_values("SETTINGS_FLAG"))
+            self.assertEqual(self.get_values("OTHER_FLAG"), [True])
+        self.load_source_flags.assert_called()
+
+    def test_without_delta_sync(self):
+        with override_settings(FLAGS_SNAPSHOT_DELTA_SYNC=False):
+            self.obj.delete()
+            self.assertIsNone(self.get_values("DB_FLAG"))
+            self.assertIsNone(get_snapshot().source_flags)
+
+        self.assertFalse(FlagStateTombstone.objects.exists())
+        self.load_source_flags.assert_called()
+
+    async def test_aget_snapshot_applies_changes(self):
+        await FlagState.objects.acreate(
+            name="NEW_FLAG", condition="boolean", value="True"
+        )
+        snapshot = await aget_snapshot()
+        self.assertIn("NEW_FLAG", snapshot.flags)
+        self.load_source_flags.assert_not_called()
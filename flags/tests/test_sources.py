@@ -1,15 +1,31 @@
-from unittest.mock import Mock
+import itertools
+import re
+from datetime import timedelta
+from unittest.mock import Mock, PropertyMock, patch
 
-from django.http import HttpRequest
+from django.http import HttpRequest, QueryDict
 from django.test import TestCase, override_settings
+from django.utils import timezone
 
 from flags.models import FlagState
+from flags.signals import source_failed
 from flags.sources import (
+    BatchedConditions,
     Condition,
+    DatabaseCondition,
     DatabaseFlagsSource,
     Flag,
+    IndexedConditions,
     SettingsFlagsSource,
+    _source_health,
+    _source_instances,
+    aget_flags,
+    check_flags,
+    find_flag_cycles,
+    get_flag,
     get_flags,
+    get_source,
+    get_sources,
 )
 
 
@@ -27,7 +43,28 @@ class ExceptionalFlagsSource:
         raise Exception("This flag source is exceptional!")
 
 
+class UnreliableFlagsSource:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    def get_flags(self):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("This flag source is down")
+        return {"UNRELIABLE_FLAG": [Condition("boolean", True)]}
+
+
 class SettingsFlagsSourceTestCase(TestCase):
+    @override_settings(FLAGS={"MY_FLAG": [("boolean", True)], "EMPTY": []})
+    def test_get_flag(self):
+        source = SettingsFlagsSource()
+        self.assertEqual(
+            source.get_flag("MY_FLAG"), [Condition("boolean", True)]
+        )
+        self.assertEqual(source.get_flag("EMPTY"), [])
+        self.assertIsNone(source.get_flag("NOT_A_FLAG"))
+
     @override_settings(FLAGS={"MY_FLAG": [("boolean", True)]})
     def test_get_flags_two_tuple(self):
         source = SettingsFlagsSource()
@@ -70,6 +107,37 @@ class SettingsFlagsSourceTestCase(TestCase):
             {"MY_FLAG": [Condition("boolean", True, required=False)]},
         )
 
+    @override_settings(FLAGS={"MY_FLAG": [("boolean", True)]})
+    def test_get_flags_parses_settings_once(self):
+        flags = SettingsFlagsSource().get_flags()
+        with patch("flags.sources.Condition") as MockCondition:
+            other_flags = SettingsFlagsSource().get_flags()
+        MockCondition.assert_not_called()
+
+        # Conditions are shared but lists are not
+        self.assertIs(flags["MY_FLAG"][0], other_flags["MY_FLAG"][0])
+        self.assertIsNot(flags["MY_FLAG"], other_flags["MY_FLAG"])
+
+    @override_settings(FLAGS={"MY_FLAG": [("boolean", True)]})
+    def test_get_flags_reparsed_when_setting_changes(self):
+        SettingsFlagsSource().get_flags()
+        with override_settings(FLAGS={"OTHER_FLAG": [("boolean", False)]}):
+            self.assertEqual(
+                SettingsFlagsSource().get_flags(),
+                {"OTHER_FLAG": [Condition("boolean", False)]},
+            )
+
+    @override_settings(FLAGS={"MY_FLAG": [("late condition", True)]})
+    def test_get_flags_condition_registered_later(self):
+        flags = SettingsFlagsSource().get_flags()
+        self.assertIsNone(flags["MY_FLAG"][0].fn)
+
+        with patch.dict(
+            "flags.conditions.registry._conditions",
+            {"late condition": lambda value, **kwargs: value},
+        ):
+            self.assertTrue(flags["MY_FLAG"][0].check())
+
 
 class DatabaseFlagsSourceTestCase(TestCase):
     def test_get_flags(self):
@@ -80,6 +148,127 @@ class DatabaseFlagsSourceTestCase(TestCase):
         flags = source.get_flags()
         self.assertEqual(flags, {"MY_FLAG": [Condition("boolean", "False")]})
 
+    def test_get_flag(self):
+        FlagState.objects.create(
+            name="MY_FLAG", condition="boolean", value="False"
+        )
+        FlagState.objects.create(
+            name="OTHER_FLAG", condition="boolean", value="True"
+        )
+        source = DatabaseFlagsSource()
+        with self.assertNumQueries(1):
+            conditions = source.get_flag("MY_FLAG")
+        self.assertEqual(conditions, [Condition("boolean", "False")])
+        self.assertIsNone(source.get_flag("NOT_A_FLAG"))
+
+    def test_get_changed_flags(self):
+        obj = FlagState.objects.create(
+            name="MY_FLAG", condition="boolean", value="False"
+        )
+        source = DatabaseFlagsSource()
+        flags = source.get_flags()
+        since = timezone.now()
+
+        obj.value = "True"
+        obj.save()
+        FlagState.objects.create(
+            name="MY_FLAG", condition="parameter", value="my_flag"
+        )
+
+        changed = source.get_changed_flags(flags, since)
+        self.assertEqual(
+            changed,
+            {
+                "MY_FLAG": [
+                    Condition("boolean", "True"),
+                    Condition("parameter", "my_flag"),
+                ]
+            },
+        )
+        self.assertEqual(flags, {"MY_FLAG": [Condition("boolean", "False")]})
+
+    def test_get_flags_loads_objects_lazily(self):
+        obj = FlagState.objects.create(
+            name="MY_FLAG", condition="boolean", value="False"
+        )
+        with self.assertNumQueries(1):
+            flags = DatabaseFlagsSource().get_flags()
+
+        condition = flags["MY_FLAG"][0]
+        self.assertEqual(condition.pk, obj.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(condition.obj, obj)
+        with self.assertNumQueries(0):
+            self.assertEqual(condition.obj, obj)
+
+    def test_get_flags_in_chunks(self):
+        for value in ("a", "b", "c"):
+            FlagState.objects.create(
+                name="MY_FLAG", condition="parameter", value=value
+            )
+        source = DatabaseFlagsSource()
+        source.chunk_size = 2
+        flags = source.get_flags()
+        self.assertEqual(
+            sorted(c.value for c in flags["MY_FLAG"]), ["a", "b", "c"]
+        )
+
+    def test_deleted_object(self):
+        obj = FlagState.objects.create(
+            name="MY_FLAG", condition="boolean", value="False"
+        )
+        flags = DatabaseFlagsSource().get_flags()
+        obj.delete()
+        self.assertIsNone(flags["MY_FLAG"][0].obj)
+
+    def test_condition_with_object(self):
+        obj = FlagState(pk=1, name="MY_FLAG")
+        condition = DatabaseCondition("boolean", "True", obj=obj)
+        self.assertEqual(condition.pk, 1)
+        with self.assertNumQueries(0):
+            self.assertIs(condition.obj, obj)
+
+
+class AsyncFlagsSourceTestCase(TestCase):
+    async def test_settings_aget_flags(self):
+        with override_settings(FLAGS={"MY_FLAG": [("boolean", True)]}):
+            flags = await SettingsFlagsSource().aget_flags()
+        self.assertEqual(flags, {"MY_FLAG": [Condition("boolean", True)]})
+
+    async def test_database_aget_flags(self):
+        await FlagState.objects.acreate(
+            name="MY_FLAG", condition="boolean", value="False"
+        )
+        flags = await DatabaseFlagsSource().aget_flags()
+        self.assertEqual(flags, {"MY_FLAG": [Condition("boolean", "False")]})
+
+    async def test_aget_flags_sync_only_source(self):
+        flags = await aget_flags(
+            sources=["flags.tests.test_sources.TestFlagsSource"]
+        )
+        self.assertIn("SOURCED_FLAG", flags)
+
+    async def test_aget_flags_ignore_errors(self):
+        _source_health.clear()
+        sources = ["flags.tests.test_sources.ExceptionalFlagsSource"]
+        with self.assertLogs("flags.sources", level="INFO"):
+            with self.assertRaises(Exception):  # noqa: B017
+                await aget_flags(sources=sources)
+            self.assertEqual(
+                await aget_flags(sources=sources, ignore_errors=True), {}
+            )
+
+    async def test_aget_flags_caches_flags_on_request(self):
+        request = HttpRequest()
+        flags = await aget_flags(request=request)
+        self.assertIs(request.flag_conditions, flags)
+        self.assertIs(await aget_flags(request=request), flags)
+
+    @override_settings(FLAGS_SNAPSHOT_CACHE=True)
+    async def test_aget_flags_uses_snapshot(self):
+        flags = await aget_flags()
+        self.assertIs(await aget_flags(), flags)
+
 
 class ConditionTestCase(TestCase):
     def test_check_fn_none(self):
@@ -87,6 +276,59 @@ class ConditionTestCase(TestCase):
         result = condition.check()
         self.assertIsNone(result)
 
+    def test_prepared_value(self):
+        condition = Condition("parameter", "my_param=value")
+        self.assertEqual(condition.value, "my_param=value")
+        self.assertEqual(condition.prepared_value, ("my_param", "value"))
+
+    def test_prepare_called_once(self):
+        prepare = Mock(return_value="prepared")
+        fn = Mock(prepare=prepare, return_value=True)
+        with patch.dict(
+            "flags.conditions.registry._conditions", {"mock condition": fn}
+        ):
+            condition = Condition("mock condition", "value")
+            condition.check()
+            condition.check(request=None)
+
+        prepare.assert_called_once_with("value")
+        fn.assert_called_with("prepared", request=None)
+
+    def test_metadata(self):
+        condition = Condition("user", "testuser")
+        self.assertEqual(condition.requires, ("request",))
+        self.assertTrue(condition.pure)
+        self.assertEqual(condition.cache_scope, "user")
+        self.assertIsNone(condition.ttl)
+
+    def test_memo_key(self):
+        self.assertEqual(
+            Condition("anonymous", "False").memo_key, ("anonymous", False)
+        )
+        self.assertIsNone(Condition("after date", "2020-01-01").memo_key)
+        self.assertIsNone(Condition("user", ["unhashable"]).memo_key)
+        self.assertIsNone(Condition("nonexistent", "value").memo_key)
+
+    def test_memo_key_follows_prepared_value(self):
+        condition = Condition("path matches", "^/my/")
+        condition.prepared_value = re.compile("^/your/")
+        self.assertEqual(
+            condition.memo_key, ("path matches", re.compile("^/your/"))
+        )
+
+    def test_metadata_unregistered(self):
+        condition = Condition("nonexistent", "value")
+        self.assertIsNone(condition.requires)
+        self.assertFalse(condition.pure)
+        self.assertIsNone(condition.cache_scope)
+        self.assertIsNone(condition.ttl)
+
+    def test_prepare_failure_uses_value(self):
+        condition = Condition("path matches", "[")
+        self.assertEqual(condition.prepared_value, "[")
+        with self.assertRaises(re.error):
+            condition.check(request=Mock(path="/"))
+
 
 class FlagTestCase(TestCase):
     def test_eq(self):
@@ -136,6 +378,218 @@ class FlagTestCase(TestCase):
         )
         self.assertFalse(flag.check_state(request=request))
 
+    def test_check_state_stops_at_first_failed_required_condition(self):
+        failing = Mock(required=True, fn=None, **{"check.return_value": False})
+        unchecked = Mock(required=True, fn=None)
+        flag = Flag("MY_FLAG", [failing, unchecked])
+        self.assertFalse(flag.check_state())
+        unchecked.check.assert_not_called()
+
+    def test_check_state_stops_at_first_passed_non_required_condition(self):
+        passing = Mock(required=False, fn=None, **{"check.return_value": True})
+        unchecked = Mock(required=False, fn=None)
+        flag = Flag("MY_FLAG", [passing, unchecked])
+        self.assertTrue(flag.check_state())
+        unchecked.check.assert_not_called()
+
+    def test_check_state_required_before_non_required(self):
+        passing = Mock(required=False, fn=None, **{"check.return_value": True})
+        failing = Mock(required=True, fn=None, **{"check.return_value": False})
+        flag = Flag("MY_FLAG", [passing, failing])
+        self.assertFalse(flag.check_state())
+        passing.check.assert_not_called()
+
+    def test_check_state_checks_cheaper_conditions_first(self):
+        request = Mock(path="/foo")
+        type(request).user = PropertyMock(side_effect=AssertionError)
+        flag = Flag(
+            "MY_FLAG",
+            [
+                Condition("user", "testuser", required=True),
+                Condition("path matches", "^/bar"),
+                Condition("boolean", False),
+            ],
+        )
+        self.assertFalse(flag.check_state(request=request))
+
+        flag = Flag(
+            "MY_FLAG",
+            [Condition("anonymous", False), Condition("boolean", True)],
+        )
+        self.assertTrue(flag.check_state(request=request))
+
+    def test_check_state_cost_order_preserves_semantics(self):
+        for costs, results, required in itertools.product(
+            itertools.product((0, 1, None), repeat=3),
+            itertools.product((True, False), repeat=3),
+            itertools.product((True, False), repeat=3),
+        ):
+            conditions = [
+                Mock(
+                    required=r,
+                    fn=Mock(cost=c, index=None, batch=None),
+                    **{"check.return_value": v},
+                )
+                for c, v, r in zip(costs, results, required, strict=True)
+            ]
+            states = list(zip(results, required, strict=True))
+            non_required = [v for v, r in states if not r]
+            expected = all(v for v, r in states if r) and (
+                any(non_required) or not non_required
+            )
+            with self.subTest(costs=costs, results=results, required=required):
+                self.assertIs(
+                    Flag("MY_FLAG", conditions).check_state(), expected
+                )
+
+    def test_compile_reused(self):
+        flag = Flag("MY_FLAG", [Condition("boolean", True, required=True)])
+        plan = flag.compile()
+        flag.check_state()
+        self.assertIs(flag._plan, plan)
+
+    def test_adding_conditions_discards_plan(self):
+        flag = Flag("MY_FLAG", [Condition("boolean", False)])
+        flag.compile()
+        flag.conditions += [Condition("boolean", True)]
+        self.assertTrue(flag.check_state())
+
+    def test_check_state_indexed_conditions(self):
+        request = HttpRequest()
+        request.user = Mock(is_anonymous=False, username="tester42")
+        flag = Flag(
+            "MY_FLAG",
+            [Condition("user", f"tester{i}") for i in range(100)]
+            + [Condition("boolean", False)],
+        )
+        plan = flag.compile()
+        self.assertEqual(len(plan), 2)
+        self.assertIsInstance(plan[1], IndexedConditions)
+        self.assertTrue(flag.check_state(request=request))
+
+        request.user.username = "tester100"
+        self.assertFalse(flag.check_state(request=request))
+
+    def test_check_state_indexed_required_conditions(self):
+        request = HttpRequest()
+        request.GET = QueryDict("a=1&b=2")
+        flag = Flag(
+            "MY_FLAG",
+            [
+                Condition("parameter", "a=1", required=True),
+                Condition("parameter", "b=2", required=True),
+                Condition("boolean", True),
+            ],
+        )
+        plan = flag.compile()
+        self.assertEqual(len([c for c in plan if c.required]), 1)
+        self.assertTrue(flag.check_state(request=request))
+
+        request.GET = QueryDict("a=1")
+        self.assertFalse(flag.check_state(request=request))
+
+    def test_single_indexable_condition_not_indexed(self):
+        flag = Flag("MY_FLAG", [Condition("boolean", True)])
+        plan = flag.compile()
+        self.assertIsInstance(plan[0], Condition)
+
+    def test_unhashable_values_not_indexed(self):
+        request = HttpRequest()
+        request.user = Mock(is_anonymous=False, username="tester")
+        flag = Flag(
+            "MY_FLAG",
+            [Condition("user", ["tester"]), Condition("user", "tester")],
+        )
+        plan = flag.compile()
+        self.assertEqual(len(plan), 2)
+        self.assertTrue(flag.check_state(request=request))
+
+    def test_invalid_values_not_indexed(self):
+        flag = Flag(
+            "MY_FLAG",
+            [Condition("boolean", "maybe"), Condition("boolean", "yes")],
+        )
+        self.assertEqual(len(flag.compile()), 2)
+        with self.assertRaises(ValueError):
+            flag.check_state()
+
+        flag = Flag(
+            "MY_FLAG",
+            [Condition("parameter", 1), Condition("parameter", "my_flag")],
+        )
+        self.assertEqual(len(flag.compile()), 2)
+
+    def test_is_request_independent(self):
+        self.assertTrue(
+            Flag(
+                "MY_FLAG",
+                [
+                    Condition("boolean", True),
+                    Condition("after date", "2020-01-01T00:00Z"),
+                ],
+            ).is_request_independent()
+        )
+        self.assertFalse(
+            Flag(
+                "MY_FLAG",
+                [Condition("boolean", True), Condition("path matches", "/")],
+            ).is_request_independent()
+        )
+        self.assertFalse(
+            Flag(
+                "MY_FLAG", [Condition("nonexistent", True)]
+            ).is_request_independent()
+        )
+
+    def test_impure_condition_not_request_independent(self):
+        fn = Mock(return_value=True, prepare=None, requires=(), pure=False)
+        fn.boundary = None
+        with patch.dict(
+            "flags.conditions.registry._conditions", {"random": fn}
+        ):
+            flag = Flag("MY_FLAG", [Condition("random", 0.5)])
+        self.assertFalse(flag.is_request_independent())
+
+    def test_precompute(self):
+        condition = Mock(
+            required=False, fn=None, **{"check.return_value": True}
+        )
+        condition.get_boundary.return_value = None
+        flag = Flag("MY_FLAG", [condition])
+        self.assertEqual(flag.precompute(), (True, []))
+        self.assertTrue(flag.check_state())
+        self.assertTrue(flag.check_state(request=None))
+        condition.check.assert_called_once_with()
+
+    def test_precompute_again(self):
+        condition = Mock(
+            required=False, fn=None, **{"check.return_value": True}
+        )
+        condition.get_boundary.return_value = None
+        flag = Flag("MY_FLAG", [condition])
+        flag.precompute()
+        condition.check.return_value = False
+        flag.precompute()
+        self.assertFalse(flag.check_state())
+
+    def test_precompute_boundaries(self):
+        future = timezone.now() + timedelta(days=1)
+        flag = Flag(
+            "MY_FLAG",
+            [
+                Condition("before date", future),
+                Condition("after date", "not a date"),
+                Condition("boolean", True),
+            ],
+        )
+        self.assertEqual(flag.precompute(), (True, [future]))
+
+    def test_adding_conditions_discards_precomputed_state(self):
+        flag = Flag("MY_FLAG", [Condition("boolean", False)])
+        flag.precompute()
+        flag.conditions += [Condition("boolean", True)]
+        self.assertTrue(flag.check_state())
+
     @override_settings(FLAGS_STATE_LOGGING=True)
     def test_flag_check_state_logs_state(self):
         flag = Flag(
@@ -156,6 +610,183 @@ class FlagTestCase(TestCase):
             ],
         )
 
+    @override_settings(FLAGS_STATE_LOGGING=True)
+    def test_flag_check_state_logs_state_required(self):
+        flag = Flag(
+            "MY_FLAG",
+            [
+                Condition("boolean", True, required=True),
+                Condition("path matches", "/foo", required=True),
+            ],
+        )
+        with self.assertLogs("flags.sources", level="INFO") as logger:
+            self.assertFalse(flag.check_state(request=Mock(path="/bar")))
+            self.assertTrue(flag.check_state(request=Mock(path="/foo")))
+            self.assertFalse(Flag("MY_FLAG").check_state())
+
+        self.assertEqual(len(logger.output), 2)
+
+
+def id_condition(value, ids=(), **kwargs):
+    return value in ids
+
+
+class BatchedConditionsTestCase(TestCase):
+    def setUp(self):
+        self.batch = Mock(
+            side_effect=lambda values, ids=(), **kwargs: [
+                value in ids for value in values
+            ]
+        )
+        self.fn = Mock(
+            side_effect=id_condition,
+            batch=self.batch,
+            prepare=None,
+            requires=None,
+            index=None,
+            cost=None,
+        )
+        patcher = patch.dict(
+            "flags.conditions.registry._conditions", {"id": self.fn}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_flag_batches_conditions(self):
+        flag = Flag("MY_FLAG", [Condition("id", i) for i in range(5)])
+        plan = flag.compile()
+        self.assertEqual(len(plan), 1)
+        self.assertIsInstance(plan[0], BatchedConditions)
+
+        self.assertTrue(flag.check_state(ids={3}))
+        self.assertFalse(flag.check_state(ids={7}))
+        self.assertEqual(self.batch.call_count, 2)
+        self.fn.assert_not_called()
+
+    def test_required_batched_conditions(self):
+        flag = Flag(
+            "MY_FLAG", [Condition("id", i, required=True) for i in range(3)]
+        )
+        self.assertTrue(flag.check_state(ids={0, 1, 2}))
+        self.assertFalse(flag.check_state(ids={0, 1}))
+
+    def test_check_flags_batches_across_flags(self):
+        flags = [
+            Flag("FLAG_A", [Condition("id", 1), Condition("boolean", False)]),
+            Flag("FLAG_B", [Condition("id", 2, required=True)]),
+            Flag("FLAG_C", [Condition("boolean", True)]),
+        ]
+        self.assertEqual(
+            check_flags(flags, ids={2}),
+            {"FLAG_A": False, "FLAG_B": True, "FLAG_C": True},
+        )
+        self.batch.assert_called_once_with([1, 2], ids={2})
+
+    def test_check_flags_single_batch_checked_with_flag(self):
+        flags = [
+            Flag("FLAG_A", [Condition("id", 1, required=True)]),
+            Flag("FLAG_B", [Condition("boolean", True)]),
+        ]
+        self.assertEqual(
+            check_flags(flags, ids=set()), {"FLAG_A": False, "FLAG_B": True}
+        )
+        self.batch.assert_called_once_with([1], ids=set())
+
+    @override_settings(FLAGS_STATE_LOGGING=True)
+    def test_check_flags_logging_checks_conditions(self):
+        flags = [
+            Flag("FLAG_A", [Condition("id", 1)]),
+            Flag("FLAG_B", [Condition("id", 2)]),
+        ]
+        with self.assertLogs("flags.sources", level="INFO"):
+            self.assertEqual(
+                check_flags(flags, ids={1}),
+                {"FLAG_A": True, "FLAG_B": False},
+            )
+        self.batch.assert_not_called()
+        self.assertEqual(self.fn.call_count, 2)
+
+
+class ConditionMemoTestCase(TestCase):
+    def setUp(self):
+        self.fn = Mock(
+            return_value=True,
+            prepare=None,
+            requires=("request",),
+            pure=True,
+            cache_scope="request",
+            index=None,
+            batch=None,
+            cost=None,
+        )
+        patcher = patch.dict(
+            "flags.conditions.registry._conditions", {"shared": self.fn}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_check_flags_shares_pure_conditions(self):
+        flags = [
+            Flag(f"FLAG_{i}", [Condition("shared", "a", required=True)])
+            for i in range(50)
+        ]
+        states = check_flags(flags, request=None)
+        self.assertEqual(set(states.values()), {True})
+        self.fn.assert_called_once_with("a", request=None)
+
+    def test_check_flags_different_values_checked(self):
+        flags = [
+            Flag("FLAG_A", [Condition("shared", "a")]),
+            Flag("FLAG_B", [Condition("shared", "b")]),
+        ]
+        check_flags(flags)
+        self.assertEqual(self.fn.call_count, 2)
+
+    def test_check_flags_impure_conditions_not_shared(self):
+        self.fn.pure = False
+        flags = [
+            Flag("FLAG_A", [Condition("shared", "a")]),
+            Flag("FLAG_B", [Condition("shared", "a")]),
+        ]
+        check_flags(flags)
+        self.assertEqual(self.fn.call_count, 2)
+
+    def test_check_state_without_memo(self):
+        flag = Flag("MY_FLAG", [Condition("shared", "a")])
+        flag.check_state()
+        flag.check_state()
+        self.assertEqual(self.fn.call_count, 2)
+
+
+class FindFlagCyclesTestCase(TestCase):
+    def make_flags(self, dependencies):
+        return {
+            name: Flag(name, [Condition("flag", d) for d in depends_on])
+            for name, depends_on in dependencies.items()
+        }
+
+    def test_no_cycles(self):
+        flags = self.make_flags(
+            {"A": ["B", "C"], "B": ["D"], "C": ["D"], "D": ["MISSING"]}
+        )
+        self.assertEqual(find_flag_cycles(flags), [])
+
+    def test_self_cycle(self):
+        flags = self.make_flags({"A": ["A"]})
+        self.assertEqual(find_flag_cycles(flags), [("A", "A")])
+
+    def test_cycles(self):
+        flags = self.make_flags(
+            {"A": ["B"], "B": ["C"], "C": ["A", "D"], "D": ["D"], "E": ["A"]}
+        )
+        self.assertEqual(
+            find_flag_cycles(flags), [("A", "B", "C", "A"), ("D", "D")]
+        )
+
+    def test_unhashable_value(self):
+        flags = self.make_flags({"A": [["A"]]})
+        self.assertEqual(find_flag_cycles(flags), [])
+
 
 class GetFlagsTestCase(TestCase):
     def test_get_flags_from_sources(self):
@@ -196,18 +827,52 @@ class GetFlagsTestCase(TestCase):
         self.assertTrue(my_flag.check_state())
 
     def test_ignore_errors(self):
-        # Without ignore_errors
-        with self.assertRaises(Exception):  # noqa: B017
-            get_flags(
-                sources=["flags.tests.test_sources.ExceptionalFlagsSource"]
+        _source_health.clear()
+        with self.assertLogs("flags.sources", level="INFO"):
+            # Without ignore_errors
+            with self.assertRaises(Exception):  # noqa: B017
+                get_flags(
+                    sources=["flags.tests.test_sources.ExceptionalFlagsSource"]
+                )
+
+            # With ignore_errors
+            flags = get_flags(
+                sources=["flags.tests.test_sources.ExceptionalFlagsSource"],
+                ignore_errors=True,
             )
+        self.assertEqual(flags, {})
 
-        # With ignore_errors
-        flags = get_flags(
-            sources=["flags.tests.test_sources.ExceptionalFlagsSource"],
-            ignore_errors=True,
+    def test_get_source_reuses_instance(self):
+        source = get_source("flags.tests.test_sources.TestFlagsSource")
+        self.assertIsInstance(source, TestFlagsSource)
+        self.assertIs(
+            get_source("flags.tests.test_sources.TestFlagsSource"), source
         )
-        self.assertEqual(flags, {})
+
+    def test_get_flags_reuses_source_instances(self):
+        get_flags(sources=["flags.tests.test_sources.TestFlagsSource"])
+        with patch("flags.sources.import_string") as import_string:
+            get_flags(sources=["flags.tests.test_sources.TestFlagsSource"])
+            get_flags()
+        import_string.assert_not_called()
+
+    def test_get_sources(self):
+        sources = get_sources()
+        self.assertEqual(
+            [type(s) for s in sources],
+            [SettingsFlagsSource, DatabaseFlagsSource],
+        )
+        self.assertIs(get_sources(), sources)
+
+    def test_get_sources_rebuilt_when_setting_changes(self):
+        sources = get_sources()
+        with override_settings(
+            FLAG_SOURCES=["flags.tests.test_sources.TestFlagsSource"]
+        ):
+            self.assertEqual(
+                [type(s) for s in get_sources()], [TestFlagsSource]
+            )
+        self.assertIsNot(get_sources()[0], sources[0])
 
     def test_caches_flags_on_request_if_provided(self):
         request = HttpRequest()
@@ -215,6 +880,61 @@ class GetFlagsTestCase(TestCase):
         get_flags(request=request)
         self.assertIsInstance(request.flag_conditions, dict)
 
+    def test_get_flag_merges_sources(self):
+        FlagState.objects.create(
+            name="MY_FLAG", condition="parameter", value="my_flag"
+        )
+        with override_settings(FLAGS={"MY_FLAG": [("boolean", False)]}):
+            flag = get_flag("MY_FLAG")
+        self.assertEqual(flag.name, "MY_FLAG")
+        self.assertEqual(
+            flag.conditions,
+            [Condition("boolean", False), Condition("parameter", "my_flag")],
+        )
+
+    def test_get_flag_non_existent(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_flag("NOT_A_FLAG"))
+
+    def test_get_flag_source_without_get_flag(self):
+        flag = get_flag(
+            "SOURCED_FLAG",
+            sources=["flags.tests.test_sources.TestFlagsSource"],
+        )
+        self.assertEqual(flag.conditions, [Condition("boolean", True)])
+
+    def test_get_flag_ignore_errors(self):
+        sources = [
+            "flags.tests.test_sources.ExceptionalFlagsSource",
+            "flags.tests.test_sources.TestFlagsSource",
+        ]
+        _source_health.clear()
+        with self.assertLogs("flags.sources", level="INFO"):
+            with self.assertRaises(Exception):  # noqa: B017
+                get_flag("SOURCED_FLAG", sources=sources)
+            self.assertIsNotNone(
+                get_flag("SOURCED_FLAG", sources=sources, ignore_errors=True)
+            )
+
+    def test_get_flag_uses_cached_flags_from_request(self):
+        request = HttpRequest()
+        flags = get_flags(request=request)
+        with self.assertNumQueries(0):
+            self.assertIs(
+                get_flag("FLAG_ENABLED", request=request),
+                flags["FLAG_ENABLED"],
+            )
+
+    @override_settings(FLAGS_SNAPSHOT_CACHE=True)
+    def test_get_flag_from_snapshot(self):
+        from flags.snapshot import get_snapshot, invalidate_snapshot
+
+        invalidate_snapshot()
+        self.assertIs(
+            get_flag("FLAG_ENABLED"), get_snapshot().flags["FLAG_ENABLED"]
+        )
+        invalidate_snapshot()
+
     def test_uses_cached_flags_from_request(self):
         request = HttpRequest()
 
@@ -230,3 +950,141 @@ class GetFlagsTestCase(TestCase):
         # But subsequent calls without a request object still redo the lookup.
         with self.assertNumQueries(1):
             get_flags()
+
+
+@override_settings(FLAGS_SOURCE_BACKOFF=1, FLAGS_SOURCE_MAX_BACKOFF=4)
+class SourceBackoffTestCase(TestCase):
+    sources = ["flags.tests.test_sources.UnreliableFlagsSource"]
+
+    def setUp(self):
+        _source_health.clear()
+        self.addCleanup(_source_health.clear)
+        _source_instances.pop(self.sources[0], None)
+        self.source = get_source(self.sources[0])
+
+        self.failures = []
+        source_failed.connect(self.receiver)
+        self.addCleanup(source_failed.disconnect, self.receiver)
+
+        patcher = patch("flags.sources.time.monotonic", return_value=100)
+        self.monotonic = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def receiver(self, sender, source, exception, failures, **kwargs):
+        self.failures.append((sender, source, type(exception), failures))
+
+    def get_flags(self):
+        return get_flags(sources=self.sources, ignore_errors=True)
+
+    def test_failing_source_not_called_during_backoff(self):
+        self.source.fail = True
+        with self.assertLogs("flags.sources", level="INFO") as logs:
+            self.assertEqual(self.get_flags(), {})
+        self.assertEqual(
+            logs.output,
+            [
+                "INFO:flags.sources:Flag source UnreliableFlagsSource failed "
+                "and is backing off: ConnectionError('This flag source is "
+                "down')"
+            ],
+        )
+        self.assertEqual(self.get_flags(), {})
+        self.assertEqual(self.source.calls, 1)
+        self.assertEqual(
+            self.failures,
+            [(UnreliableFlagsSource, self.source, ConnectionError, 1)],
+        )
+
+    def test_backoff_doubles_up_to_maximum(self):
+        self.source.fail = True
+        retry_ats = []
+        with self.assertLogs("flags.sources", level="INFO") as logs:
+            for _ in range(5):
+                self.get_flags()
+                retry_ats.append(_source_health[self.source].retry_at)
+                self.monotonic.return_value = retry_ats[-1]
+
+        self.assertEqual(self.source.calls, 5)
+        self.assertEqual(len(logs.output), 1)
+        self.assertEqual(retry_ats, [101, 103, 107, 111, 115])
+        self.assertEqual([f[3] for f in self.failures], [1, 2, 3, 4, 5])
+
+    def test_last_good_flags_used_during_backoff(self):
+        flags = self.get_flags()
+        self.source.fail = True
+        with self.assertLogs("flags.sources", level="INFO"):
+            self.assertEqual(self.get_flags().keys(), flags.keys())
+        self.assertEqual(self.get_flags().keys(), flags.keys())
+        self.assertEqual(self.source.calls, 2)
+
+    def test_last_good_flag_used_during_backoff(self):
+        self.get_flags()
+        self.source.fail = True
+        with self.assertLogs("flags.sources", level="INFO"):
+            self.get_flags()
+
+        flag = get_flag(
+            "UNRELIABLE_FLAG", sources=self.sources, ignore_errors=True
+        )
+        self.assertEqual(flag.conditions, [Condition("boolean", True)])
+        self.assertEqual(self.source.calls, 2)
+
+    def test_get_flag_failure_falls_back_to_last_good_flag(self):
+        self.get_flags()
+        self.source.fail = True
+        with self.assertLogs("flags.sources", level="INFO"):
+            flag = get_flag(
+                "UNRELIABLE_FLAG", sources=self.sources, ignore_errors=True
+            )
+        self.assertEqual(flag.conditions, [Condition("boolean", True)])
+        self.assertEqual(self.source.calls, 2)
+        self.assertEqual(
+            self.failures,
+            [(UnreliableFlagsSource, self.source, ConnectionError, 1)],
+        )
+        self.assertTrue(_source_health[self.source].in_backoff())
+
+    def test_success_after_backoff_resets_failures(self):
+        self.source.fail = True
+        with self.assertLogs("flags.sources", level="INFO"):
+            self.get_flags()
+
+        self.source.fail = False
+        self.monotonic.return_value = 101
+        self.assertIn("UNRELIABLE_FLAG", self.get_flags())
+        self.assertEqual(_source_health[self.source].failures, 0)
+        self.assertFalse(_source_health[self.source].in_backoff())
+
+    def test_without_ignore_errors_source_always_called(self):
+        self.source.fail = True
+        with self.assertLogs("flags.sources", level="INFO"):
+            for _ in range(2):
+                with self.assertRaises(ConnectionError):
+                    get_flags(sources=self.sources)
+        self.assertEqual(self.source.calls, 2)
+        self.assertEqual(len(self.failures), 2)
+
+    def test_failing_receiver_does_not_break_loading(self):
+        def broken_receiver(**kwargs):
+            raise ValueError
+
+        source_failed.connect(broken_receiver)
+        self.addCleanup(source_failed.disconnect, broken_receiver)
+        self.source.fail = True
+        with self.assertLogs("flags.sources", level="INFO"):
+            self.assertEqual(self.get_flags(), {})
+
+    async def test_aget_flags_backoff(self):
+        self.source.fail = True
+        with self.assertLogs("flags.sources", level="INFO"):
+            await aget_flags(sources=self.sources, ignore_errors=True)
+        await aget_flags(sources=self.sources, ignore_errors=True)
+        self.assertEqual(self.source.calls, 1)
+        self.assertEqual(len(self.failures), 1)
+
+    def test_health_cleared_when_sources_change(self):
+        self.source.fail = True
+        with self.assertLogs("flags.sources", level="INFO"):
+            self.get_flags()
+        with override_settings(FLAG_SOURCES=self.sources):
+            self.assertEqual(_source_health, {})
@@ -1,15 +1,23 @@
 from unittest import mock
 
+from django.contrib.auth.models import User
 from django.core.exceptions import AppRegistryNotReady
-from django.test import RequestFactory, TestCase
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils.functional import SimpleLazyObject
 
 from flags.models import FlagState
+from flags.snapshot import invalidate_snapshot
 from flags.state import (
+    aflag_disabled,
+    aflag_enabled,
+    aflag_state,
+    aflag_states,
     disable_flag,
     enable_flag,
     flag_disabled,
     flag_enabled,
     flag_state,
+    flag_states,
 )
 
 
@@ -25,6 +33,15 @@ class FlagStateTestCase(TestCase):
         """Non-existent flags are falsy"""
         self.assertFalse(flag_state("FLAG_DOES_NOT_EXIST"))
 
+    @mock.patch("flags.state.get_flags")
+    def test_flag_state_looks_up_single_flag(self, get_flags):
+        FlagState.objects.create(
+            name="DB_FLAG", condition="boolean", value="True"
+        )
+        with self.assertNumQueries(1):
+            self.assertTrue(flag_state("DB_FLAG"))
+        get_flags.assert_not_called()
+
     def test_flag_state_enabled(self):
         """Global flags that are enabled should be True"""
         self.assertTrue(flag_state("FLAG_ENABLED"))
@@ -88,3 +105,401 @@ class FlagStateTestCase(TestCase):
         self.assertFalse(flag_disabled("DB_FLAG"))
         disable_flag("DB_FLAG")
         self.assertTrue(flag_disabled("DB_FLAG"))
+
+    def test_flag_state_cached_on_request(self):
+        request = self.factory.get("/test")
+        with mock.patch("flags.sources.Flag._check_state") as check_state:
+            check_state.return_value = True
+            for _ in range(40):
+                self.assertTrue(flag_state("FLAG_ENABLED", request=request))
+
+        check_state.assert_called_once()
+        self.assertEqual(check_state.call_args.args[0], {"request": request})
+        self.assertEqual(request.flag_states, {("FLAG_ENABLED", ()): True})
+
+    def test_flag_state_cached_on_request_by_kwargs(self):
+        request = self.factory.get("/test")
+        self.assertTrue(
+            flag_state(
+                "FLAG_ENABLED_WITH_KWARG", request=request, passed_value=4
+            )
+        )
+        self.assertFalse(
+            flag_state(
+                "FLAG_ENABLED_WITH_KWARG", request=request, passed_value=5
+            )
+        )
+
+    def test_flag_state_unhashable_kwargs_not_cached(self):
+        request = self.factory.get("/test")
+        self.assertFalse(
+            flag_state(
+                "FLAG_ENABLED_WITH_KWARG", request=request, passed_value=[4]
+            )
+        )
+        self.assertEqual(request.flag_states, {})
+
+    def test_non_existent_flag_cached_on_request(self):
+        request = self.factory.get("/test")
+        self.assertIsNone(flag_state("FLAG_DOES_NOT_EXIST", request=request))
+
+        with mock.patch("flags.state.get_flags") as get_flags:
+            self.assertIsNone(
+                flag_state("FLAG_DOES_NOT_EXIST", request=request)
+            )
+        get_flags.assert_not_called()
+
+    @override_settings(FLAGS={})
+    def test_no_flags_cached_on_request(self):
+        request = self.factory.get("/test")
+        with self.assertNumQueries(1):
+            flag_state("FLAG_DOES_NOT_EXIST", request=request)
+            flag_state("ANOTHER_FLAG_DOES_NOT_EXIST", request=request)
+
+    def test_enable_flag_clears_request_cache(self):
+        request = self.factory.get("/test")
+        self.assertFalse(flag_enabled("DB_FLAG", request=request))
+        enable_flag("DB_FLAG", request=request)
+        self.assertTrue(flag_enabled("DB_FLAG", request=request))
+
+    def test_flag_states(self):
+        self.assertEqual(
+            flag_states(["FLAG_ENABLED", "FLAG_DISABLED", "DOES_NOT_EXIST"]),
+            {
+                "FLAG_ENABLED": True,
+                "FLAG_DISABLED": False,
+                "DOES_NOT_EXIST": None,
+            },
+        )
+
+    def test_flag_states_all_flags(self):
+        states = flag_states(passed_value=4)
+        self.assertEqual(
+            states,
+            {
+                "FLAG_ENABLED": True,
+                "FLAG_ENABLED_WITH_KWARG": True,
+                "FLAG_DISABLED": False,
+                "DB_FLAG": False,
+            },
+        )
+
+    def test_flag_states_gets_flags_once(self):
+        with self.assertNumQueries(1):
+            flag_states(["FLAG_ENABLED", "FLAG_DISABLED", "DB_FLAG"])
+
+    def test_flag_states_cached_on_request(self):
+        request = self.factory.get("/test")
+        flag_states(["FLAG_ENABLED", "FLAG_DISABLED"], request=request)
+        self.assertEqual(
+            request.flag_states,
+            {("FLAG_ENABLED", ()): True, ("FLAG_DISABLED", ()): False},
+        )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                flag_states(["FLAG_ENABLED"], request=request),
+                {"FLAG_ENABLED": True},
+            )
+
+    def test_flag_states_batches_conditions(self):
+        batch = mock.Mock(
+            side_effect=lambda values, **kwargs: [True for value in values]
+        )
+        fn = mock.Mock(
+            batch=batch, prepare=None, requires=None, index=None, cost=None
+        )
+        with (
+            mock.patch.dict(
+                "flags.conditions.registry._conditions", {"batched": fn}
+            ),
+            override_settings(
+                FLAGS={
+                    "FLAG_A": [("batched", "a")],
+                    "FLAG_B": [("batched", "b"), ("batched", "c")],
+                }
+            ),
+        ):
+            self.assertEqual(
+                flag_states(["FLAG_A", "FLAG_B"]),
+                {"FLAG_A": True, "FLAG_B": True},
+            )
+
+        batch.assert_called_once_with(["a", "b", "c"])
+        fn.assert_not_called()
+
+    def test_pure_conditions_shared_across_flags_in_request(self):
+        request = self.factory.get("/test")
+        request.user = mock.Mock(is_anonymous=False)
+        with override_settings(
+            FLAGS={
+                "FLAG_A": [("anonymous", "False")],
+                "FLAG_B": [("anonymous", "False", True), ("boolean", True)],
+            }
+        ):
+            self.assertTrue(flag_state("FLAG_A", request=request))
+            request.user.is_anonymous = True
+            self.assertTrue(flag_state("FLAG_B", request=request))
+            self.assertFalse(
+                flag_state("FLAG_B", request=request, passed_value=1)
+            )
+
+        self.assertEqual(
+            request.flag_condition_results,
+            {
+                (): {
+                    ("anonymous", False): True,
+                    ("boolean", True): True,
+                    ("flag", "FLAG_A"): True,
+                    ("flag", "FLAG_B"): True,
+                },
+                (("passed_value", 1),): {
+                    ("boolean", True): True,
+                    ("anonymous", False): False,
+                    ("flag", "FLAG_B"): False,
+                },
+            },
+        )
+
+    @mock.patch("flags.state.apps")
+    def test_flag_states_apps_not_ready(self, mock_apps):
+        mock_apps.ready = False
+        with self.assertRaises(AppRegistryNotReady):
+            flag_states()
+
+
+class FlagDependencyTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.fn = mock.Mock(
+            return_value=True,
+            prepare=None,
+            requires=("request",),
+            pure=False,
+            index=None,
+            batch=None,
+            cost=None,
+        )
+        patcher = mock.patch.dict(
+            "flags.conditions.registry._conditions", {"counted": self.fn}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_dependency_of_single_flag_looked_up(self):
+        FlagState.objects.create(
+            name="DB_UPSTREAM", condition="boolean", value="True"
+        )
+        with override_settings(
+            FLAGS={"DB_DOWNSTREAM": [("flag", "DB_UPSTREAM")]}
+        ):
+            self.assertTrue(flag_state("DB_DOWNSTREAM"))
+
+    def dependent_flags(self):
+        return override_settings(
+            FLAGS={
+                "UPSTREAM": [("counted", "value")],
+                "DOWNSTREAM": [
+                    ("flag", "UPSTREAM", True),
+                    ("boolean", True),
+                ],
+                **{
+                    f"DOWNSTREAM_{i}": [("flag", "UPSTREAM")]
+                    for i in range(10)
+                },
+            }
+        )
+
+    def test_flag_depends_on_flag(self):
+        with self.dependent_flags():
+            self.assertTrue(flag_state("DOWNSTREAM"))
+            self.fn.return_value = False
+            self.assertFalse(flag_state("DOWNSTREAM"))
+
+    def test_upstream_checked_once_per_request(self):
+        request = self.factory.get("/test")
+        with self.dependent_flags():
+            for i in range(10):
+                self.assertTrue(flag_state(f"DOWNSTREAM_{i}", request=request))
+            self.assertTrue(flag_state("UPSTREAM", request=request))
+        self.fn.assert_called_once_with("value", request=request)
+
+    def test_upstream_checked_once_per_flag_states(self):
+        with self.dependent_flags():
+            states = flag_states()
+        self.assertEqual(set(states.values()), {True})
+        self.fn.assert_called_once_with("value")
+
+    @override_settings(
+        FLAGS={
+            "FLAG_A": [("flag", "FLAG_B")],
+            "FLAG_B": [("flag", "FLAG_A")],
+            "FLAG_C": [("flag", "FLAG_C"), ("boolean", True)],
+        }
+    )
+    def test_cycles_are_false(self):
+        self.assertFalse(flag_state("FLAG_A"))
+        self.assertFalse(flag_state("FLAG_B"))
+        self.assertTrue(flag_state("FLAG_C"))
+
+    @override_settings(
+        FLAGS={"DOWNSTREAM": [("flag", "DB_FLAG")], "DB_FLAG": []}
+    )
+    async def test_aflag_state_depends_on_flag(self):
+        await FlagState.objects.acreate(
+            name="DB_FLAG", condition="boolean", value="True"
+        )
+        self.assertTrue(await aflag_state("DOWNSTREAM"))
+
+    @override_settings(
+        FLAGS_SNAPSHOT_CACHE=True,
+        FLAGS={
+            "FLAG_A": [("flag", "FLAG_B")],
+            "FLAG_B": [("flag", "FLAG_A")],
+        },
+    )
+    def test_snapshot_logs_cycles(self):
+        invalidate_snapshot()
+        with self.assertLogs("flags.snapshot", level="WARNING") as logger:
+            self.assertFalse(flag_state("FLAG_A"))
+        self.assertEqual(
+            logger.output,
+            [
+                "WARNING:flags.snapshot:Flags depend on each other: "
+                "FLAG_A -> FLAG_B -> FLAG_A."
+            ],
+        )
+
+
+@override_settings(
+    FLAGS_SNAPSHOT_CACHE=True,
+    FLAGS={
+        "CONSTANT_FLAG": [("boolean", True)],
+        "PATH_FLAG": [("path matches", "^/test")],
+        "DB_FLAG": [],
+    },
+)
+class PrecomputedFlagStateTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        invalidate_snapshot()
+
+    def test_constant_flag_not_checked(self):
+        request = self.factory.get("/test")
+        flag_state("CONSTANT_FLAG")
+        with mock.patch("flags.sources.Flag._check_state") as check_state:
+            self.assertTrue(flag_state("CONSTANT_FLAG"))
+            self.assertTrue(flag_state("CONSTANT_FLAG", request=request))
+        check_state.assert_not_called()
+        self.assertEqual(request.flag_states, {})
+
+    def test_request_dependent_flag_checked(self):
+        request = self.factory.get("/test")
+        self.assertTrue(flag_state("PATH_FLAG", request=request))
+        self.assertFalse(
+            flag_state("PATH_FLAG", request=self.factory.get("/other"))
+        )
+
+    def test_flag_states(self):
+        request = self.factory.get("/other")
+        self.assertEqual(
+            flag_states(request=request),
+            {"CONSTANT_FLAG": True, "PATH_FLAG": False, "DB_FLAG": False},
+        )
+
+    def test_request_snapshot_cached_on_request(self):
+        request = self.factory.get("/test")
+        flag_state("CONSTANT_FLAG", request=request)
+        snapshot = request.flag_snapshot
+        invalidate_snapshot()
+        flag_state("PATH_FLAG", request=request)
+        self.assertIs(request.flag_snapshot, snapshot)
+
+    def test_enable_flag_clears_request_snapshot(self):
+        request = self.factory.get("/test")
+        self.assertFalse(flag_enabled("DB_FLAG", request=request))
+        enable_flag("DB_FLAG", request=request)
+        self.assertTrue(flag_enabled("DB_FLAG", request=request))
+
+    @override_settings(FLAGS_STATE_LOGGING=True)
+    def test_logging_checks_constant_flags(self):
+        with self.assertLogs("flags.sources", level="INFO"):
+            self.assertTrue(flag_state("CONSTANT_FLAG"))
+
+    async def test_aflag_state_constant_flag_not_checked(self):
+        await aflag_state("CONSTANT_FLAG")
+        with mock.patch("flags.sources.Flag._check_state") as check_state:
+            self.assertTrue(await aflag_state("CONSTANT_FLAG"))
+        check_state.assert_not_called()
+
+
+class AsyncFlagStateTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    async def test_aflag_state(self):
+        self.assertTrue(await aflag_state("FLAG_ENABLED"))
+        self.assertFalse(await aflag_state("FLAG_DISABLED"))
+        self.assertIsNone(await aflag_state("FLAG_DOES_NOT_EXIST"))
+
+    async def test_aflag_state_database_flag(self):
+        await FlagState.objects.acreate(
+            name="DB_FLAG", condition="boolean", value="True"
+        )
+        self.assertTrue(await aflag_state("DB_FLAG"))
+
+    async def test_aflag_state_cached_on_request(self):
+        request = self.factory.get("/test")
+        self.assertTrue(await aflag_state("FLAG_ENABLED", request=request))
+        self.assertEqual(request.flag_states, {("FLAG_ENABLED", ()): True})
+
+    async def test_aflag_states(self):
+        self.assertEqual(
+            await aflag_states(["FLAG_ENABLED", "FLAG_DISABLED"]),
+            {"FLAG_ENABLED": True, "FLAG_DISABLED": False},
+        )
+        self.assertIn("DB_FLAG", await aflag_states())
+
+    async def test_aflag_enabled(self):
+        self.assertTrue(await aflag_enabled("FLAG_ENABLED"))
+        self.assertFalse(await aflag_enabled("FLAG_DISABLED"))
+
+    async def test_aflag_disabled(self):
+        self.assertFalse(await aflag_disabled("FLAG_ENABLED"))
+        self.assertTrue(await aflag_disabled("FLAG_DISABLED"))
+
+    async def test_aflag_state_lazy_user(self):
+        await User.objects.acreate(username="bob")
+        request = self.factory.get("/test")
+        request.user = SimpleLazyObject(
+            lambda: User.objects.get(username="bob")
+        )
+        with override_settings(
+            FLAGS={
+                "USER_FLAG": [("user", "bob")],
+                "ANONYMOUS_FLAG": [("anonymous", True)],
+            }
+        ):
+            self.assertTrue(await aflag_state("USER_FLAG", request=request))
+            self.assertFalse(
+                await aflag_state("ANONYMOUS_FLAG", request=request)
+            )
+
+    @override_settings(
+        FLAGS_SNAPSHOT_CACHE=True, FLAGS={"USER_FLAG": [("user", "bob")]}
+    )
+    async def test_aflag_state_lazy_user_with_snapshot(self):
+        invalidate_snapshot()
+        self.addCleanup(invalidate_snapshot)
+        await User.objects.acreate(username="bob")
+        request = self.factory.get("/test")
+        request.user = SimpleLazyObject(
+            lambda: User.objects.get(username="bob")
+        )
+        self.assertTrue(await aflag_state("USER_FLAG", request=request))
+
+    @mock.patch("flags.state.apps")
+    async def test_aflag_state_apps_not_ready(self, mock_apps):
+        mock_apps.ready = False
+        with self.assertRaises(AppRegistryNotReady):
+            await aflag_state("FLAG_ENABLED")
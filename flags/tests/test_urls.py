@@ -1,4 +1,5 @@
 from unittest import skipIf
+from unittest.mock import patch
 
 from django.http import Http404, HttpResponse
 from django.test import RequestFactory, TestCase, override_settings
@@ -239,6 +240,44 @@ class FlagCheckTestCase(TestCase):
         )
         self.assertContains(response, "fallback")
 
+    def test_flagged_url_patterns_built_once(self):
+        resolver = urlpatterns[8]
+        url_patterns = resolver.url_patterns
+        self.assertIs(resolver.url_patterns, url_patterns)
+
+        with patch("flags.urls.flag_check") as mock_flag_check:
+            self.get_url_response(
+                "/include-fallback-include/included-url-with-fallback"
+            )
+        mock_flag_check.assert_not_called()
+
+    def test_unflagged_patterns_never_cached(self):
+        resolver = flagged_re_path(
+            "FLAGGED_URL", r"^include/", include(extra_patterns)
+        )
+        cached = []
+
+        def spy_flag_check(*args, **kwargs):
+            cached.append(resolver.__dict__.get("url_patterns"))
+            return lambda view: view
+
+        with patch("flags.urls.flag_check", side_effect=spy_flag_check):
+            url_patterns = resolver.url_patterns
+
+        self.assertEqual(cached, [None, None])
+        self.assertIs(resolver.__dict__["url_patterns"], url_patterns)
+
+    def test_flagged_url_patterns_fallbacks(self):
+        resolver = urlpatterns[8]
+        self.assertEqual(
+            [p.pattern.describe() for p in resolver.url_patterns],
+            [
+                "'^included-url$'",
+                "'^included-url-with-fallback$'",
+                "'^other-included-url$'",
+            ],
+        )
+
     def test_flagged_url_not_callable(self):
         with self.assertRaises(TypeError):
             flagged_re_path("MY_FLAG", r"^my_url/$", "string")
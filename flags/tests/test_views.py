@@ -5,6 +5,8 @@ from django.http import Http404, HttpRequest, HttpResponse
 from django.test import TestCase, override_settings
 from django.views.generic import View
 
+from asgiref.sync import iscoroutinefunction
+
 from flags.views import FlaggedViewMixin
 
 
@@ -13,6 +15,11 @@ class TestView(FlaggedViewMixin, View):
         return HttpResponse("ok")
 
 
+class AsyncTestView(FlaggedViewMixin, View):
+    async def get(self, request, *args, **kwargs):
+        return HttpResponse("ok")
+
+
 class FlaggedViewMixinTestCase(TestCase):
     def setUp(self):
         self.flag_name = "FLAGGED_VIEW_MIXIN"
@@ -93,3 +100,24 @@ class FlaggedViewMixinTestCase(TestCase):
             )
 
             self.assertContains(response, "ok")
+
+
+class AsyncFlaggedViewMixinTestCase(TestCase):
+    def request(self):
+        request = HttpRequest()
+        request.method = "GET"
+        return request
+
+    def test_view_is_coroutine(self):
+        view = AsyncTestView.as_view(flag_name="FLAG_ENABLED")
+        self.assertTrue(iscoroutinefunction(view))
+
+    async def test_flag_enabled(self):
+        view = AsyncTestView.as_view(flag_name="FLAG_ENABLED")
+        response = await view(self.request())
+        self.assertContains(response, "ok")
+
+    async def test_flag_disabled(self):
+        view = AsyncTestView.as_view(flag_name="FLAG_DISABLED")
+        with self.assertRaises(Http404):
+            await view(self.request())
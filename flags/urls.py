@@ -7,6 +7,7 @@ from django.urls.resolvers import (
     URLPattern,
     URLResolver,
 )
+from django.utils.functional import cached_property
 
 from flags.decorators import flag_check
 
@@ -46,25 +47,34 @@ class FlaggedURLResolver(URLResolver):
                 namespace=namespace,
             ).url_patterns
 
-    @property
+    @cached_property
     def url_patterns(self):
+        # Django reads url_patterns on every resolve(), so the flagged
+        # patterns are built once, like URLResolver.url_patterns.
+
+        # Index the fallback views by their described pattern, keeping the
+        # first fallback for each pattern.
+        fallback_callbacks = {}
+        for p in self.fallback_patterns:
+            fallback_callbacks.setdefault(p.pattern.describe(), p.callback)
+
         # First, add our "positively" flagged URLs, where when the flag
         # matches the defined state, the view is served for the pattern
         # and not the fallback.
         url_patterns = []
-        for pattern in super().url_patterns:
-            # Get the fallback view, if there is one, and remove it from
-            # the list of fallback patterns.
+        described_patterns = set()
+        # The included patterns are loaded without URLResolver's cache,
+        # which shares this property's attribute. A resolve() running
+        # while the flagged patterns are built must never see the included
+        # patterns there without their flag checks.
+        for pattern in URLResolver.url_patterns.func(self):
+            described_pattern = pattern.pattern.describe()
+            described_patterns.add(described_pattern)
+
+            # Get the fallback view, if there is one.
             fallback = self.fallback
             if isinstance(self.fallback, (list, tuple)):
-                fallback = next(
-                    (
-                        p.callback
-                        for p in self.fallback_patterns
-                        if p.pattern.describe() == pattern.pattern.describe()
-                    ),
-                    None,
-                )
+                fallback = fallback_callbacks.get(described_pattern)
 
             flag_decorator = flag_check(
                 self.flag_name, self.state, fallback=fallback
@@ -84,7 +94,6 @@ class FlaggedURLResolver(URLResolver):
         # Next, add "negatively" flagged URLs, where the flag does not match
         # the defined state, for any remaining fallback patterns that didn't
         # match other url patterns.
-        described_patterns = [p.pattern.describe() for p in url_patterns]
         negative_patterns = (
             p
             for p in self.fallback_patterns